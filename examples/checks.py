@@ -0,0 +1,125 @@
+# run from the repository root : python -m examples.checks
+# small behaviour checks of the examples and src modules, each one an assertion
+# on a run that used to break; prints the name of every check that passes
+
+import numpy as np
+
+
+def check_dispatching_float_factors():
+    """
+    the dispatching example accepts float factors (as sampled by the metamodel)
+    """
+    from examples.dispatching import simulate
+
+    for mode in (0, 1, 2):
+        result = simulate(
+            dispatching_mode=mode, n_loads=6, unload_time=18.0, travel_time=22.5, seed=1
+        )
+        assert len(result["waiting_times"]) == 6
+        # every stage of every load was recorded
+        assert not np.isnan(result["ticket_times"]).any()
+
+
+def check_loader_capacities_not_contiguous():
+    """
+    capacities with gaps are screened against c - 1, not the previous listed one
+    """
+    import random
+    from functools import partial
+
+    from src.datagen import generate_data
+    from src.queueing import (
+        loader_capacity_study,
+        loader_profile,
+        screen_capacities,
+        simulated_loader_waits,
+    )
+
+    random.seed(2)
+    data = generate_data(min_orders=30, max_orders=30)
+    profile = loader_profile(data["tickets"])
+    key = ["ship_loc", "capacity"]
+    gaps = screen_capacities(profile, [1, 3], max_wait=10).set_index(key)["verdict"]
+    full = screen_capacities(profile, [1, 2, 3], max_wait=10).set_index(key)["verdict"]
+    assert gaps.equals(full.drop(index=2, level="capacity"))
+
+    study = loader_capacity_study(
+        data, [1, 3], max_wait=10, simulate=partial(simulated_loader_waits, seed=0)
+    )
+    # capacity 3 is never judged from capacity 1
+    top = study[(study["capacity"] == 3) & study["sim_wait"].isna()]
+    assert all(gaps[(row.ship_loc, 3)] == row.verdict for row in top.itertuples())
+
+
+def check_shift_calendar_reuse():
+    """
+    one ShiftCalendar drives several engines with the same result
+    """
+    import random
+
+    import simpy
+
+    from src.datagen import generate_data
+    from src.simobj import ShiftCalendar, SimEngine
+
+    random.seed(3)
+    data = generate_data()
+    calendar = ShiftCalendar.from_trucks(data["trucks"], days=2)
+    completed = []
+    for _ in range(2):
+        se = SimEngine(
+            env=simpy.Environment(),
+            orderlist=data["orders"],
+            ticketlist=data["tickets"],
+            depotlist=data["depots"],
+            trucklist=data["trucks"],
+            shifts=calendar,
+        )
+        random.seed(0)
+        se.run(until=2 * 24 * 60)
+        completed.append(se.completed_tickets)
+    assert completed[0] == completed[1] > 0
+
+
+def check_load_spacing_unfinished_loads():
+    """
+    a plan that finishes fewer loads is not rewarded for the waits it skips
+    """
+    import random
+
+    from src.datagen import generate_data
+    from src.loadspacing import plan_accepted, verify_plan, worse_orders
+
+    random.seed(4)
+    data = generate_data(min_orders=6, max_orders=6, number_of_trucks=6)
+    # trucks live at one depot (home and return) : tickets shipped from the other
+    # depots never finish
+    depot_id = data["tickets"]["ship_loc"].iloc[0]
+    data["trucks"]["home_depot"] = depot_id
+    data["tickets"]["return_loc"] = depot_id
+    order_id = data["tickets"]["order_id"].iloc[0]
+    # the "optimized" plan ships one of the finishing orders from an empty depot
+    tickets = data["tickets"].copy()
+    moved = tickets["order_id"] == order_id
+    depots = data["depots"]["depot_id"]
+    tickets.loc[moved, "ship_loc"] = depots[depots != depot_id].iloc[0]
+
+    summary, by_order = verify_plan(data, tickets, n_reps=2, seed=0)
+    assert summary.loc["optimized", "unfinished"] > summary.loc["current", "unfinished"]
+    assert by_order.loc[order_id, "optimized_unfinished"] == moved.sum()
+    assert not by_order.isna().any().any()
+    assert order_id in worse_orders(by_order)
+    assert not plan_accepted(summary)
+
+
+CHECKS = [
+    check_dispatching_float_factors,
+    check_loader_capacities_not_contiguous,
+    check_shift_calendar_reuse,
+    check_load_spacing_unfinished_loads,
+]
+
+if __name__ == "__main__":
+    for check in CHECKS:
+        check()
+        print(f"ok  {check.__name__}")
@@ -1,4 +1,5 @@
 # DEBUG, INFO, WARNING, ERROR, CRITICAL
+# run from the repository root : python -m examples.dispatching
 import datetime
 import logging
 import random
@@ -7,7 +8,10 @@ from dataclasses import dataclass
 import numpy as np
 import pandas as pd
 import simpy
-from tqdm import tqdm
+
+from src.analysis import mser_truncation
+from src.pipeline import Pipeline, Stage
+from src.simstats import BatchFileHandler, start_queued_logging
 
 
 def configure_logger(
@@ -15,26 +19,27 @@ def configure_logger(
     log_to_file=False,
     filename=None,
     level=logging.INFO,
+    max_bytes=50 * 2**20,
+    binary=False,
 ):
-    # Remove all existing handlers
-    logger.handlers = []
-
-    # Set the log level
-    logger.setLevel(level)
+    # handlers run on a background writer thread fed through a queue
+    handlers = []
 
     if log_to_console:
         # Create a console handler
         console_handler = logging.StreamHandler()
         console_handler.setLevel(level)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
 
     if log_to_file and filename:
-        # Create a file handler
-        file_handler = logging.FileHandler(filename)
+        # Create a batched, size rotated file handler
+        file_handler = BatchFileHandler(filename, max_bytes=max_bytes, binary=binary)
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    start_queued_logging(logger, handlers, level)
     return logger
 
 
@@ -90,7 +95,7 @@ def create_tickets(orderbook):
     tickets = []
     for _, row in orderbook.iterrows():
         ticket = Ticket(
-            load_number=row["load_number"],
+            load_number=int(row["load_number"]),
             depot_prep_time=row["depot_prep_time"],
             travel_time=row["travel_time"],
             site_prep_time=row["site_prep_time"],
@@ -172,14 +177,14 @@ def update_expected_release_time(
     )
 
     if stage_name == "depot_prep":
-        expected_release_times[f"{ticket.load_number}_{stage_name}"] = (
+        expected_release_times[ticket.load_number, stage_name] = (
             env.now
             + ticket.travel_time
             + ticket.site_prep_time
             + average_unloading_time
             + average_waiting_time
         )
-        expected_release_times_details[f"{ticket.load_number}_{stage_name}"] = {
+        expected_release_times_details[ticket.load_number, stage_name] = {
             "env.now": env.now,
             "ticket.travel_time": ticket.travel_time,
             "ticket.site_prep_time": ticket.site_prep_time,
@@ -189,13 +194,13 @@ def update_expected_release_time(
             "unload_times": unload_times,
         }
     elif stage_name == "travel_to":
-        expected_release_times[f"{ticket.load_number}_{stage_name}"] = (
+        expected_release_times[ticket.load_number, stage_name] = (
             env.now
             + ticket.site_prep_time
             + average_unloading_time
             + average_waiting_time
         )
-        expected_release_times_details[f"{ticket.load_number}_{stage_name}"] = {
+        expected_release_times_details[ticket.load_number, stage_name] = {
             "env.now": env.now,
             "ticket.travel_time": None,
             "ticket.site_prep_time": ticket.site_prep_time,
@@ -205,10 +210,10 @@ def update_expected_release_time(
             "unload_times": unload_times,
         }
     elif stage_name == "site_prep":
-        expected_release_times[f"{ticket.load_number}_{stage_name}"] = (
+        expected_release_times[ticket.load_number, stage_name] = (
             env.now + average_unloading_time + average_waiting_time
         )
-        expected_release_times_details[f"{ticket.load_number}_{stage_name}"] = {
+        expected_release_times_details[ticket.load_number, stage_name] = {
             "env.now": env.now,
             "ticket.travel_time": None,
             "ticket.site_prep_time": None,
@@ -228,106 +233,76 @@ def get_expected_release_time(expected_release_times):
         return None, 0
 
 
-def ticket_process(env, ticket):
-    name = f"{ticket.load_number}"
-
-    if name not in ticket_times:
-        ticket_times[name] = {}
-
-    start_time = env.now
-    stage_numb = "1"
-    stage_name = "depot_prep"
-    stage_id = f"{stage_numb}_{stage_name}"
-    printer.debug(f"{name}: {stage_name}: {start_time:.2f}")
-    yield env.timeout(ticket.depot_prep_time)
-    ticket_times[name][stage_id] = (start_time, env.now)
-    update_expected_release_time(
-        ticket, expected_release_times, waiting_times, stage_name
-    )
+def expected_release_hook(stage_name):
+    def hook(ticket, ctx, entered, now):
+        update_expected_release_time(
+            ticket, expected_release_times, waiting_times, stage_name
+        )
 
-    start_time = env.now
-    stage_numb = "2"
-    stage_name = "travel_to"
-    stage_id = f"{stage_numb}_{stage_name}"
-    printer.debug(f"{name}: {stage_name}: {start_time:.2f}")
-    yield env.timeout(ticket.travel_time)
-    ticket_times[name][stage_id] = (start_time, env.now)
-    update_expected_release_time(
-        ticket, expected_release_times, waiting_times, stage_name
-    )
+    return hook
+
+
+def record_waiting(ticket, ctx, entered, now):
+    waiting_times.append(now - entered)
+
+
+def record_unloading(ticket, ctx, entered, now):
+    unload_times.append(now - entered)
+
+
+TICKET_PIPELINE = Pipeline(
+    [
+        Stage(
+            "depot_prep",
+            "depot_prep_time",
+            on_end=expected_release_hook("depot_prep"),
+        ),
+        Stage(
+            "travel_to",
+            "travel_time",
+            on_end=expected_release_hook("travel_to"),
+        ),
+        Stage(
+            "site_prep",
+            "site_prep_time",
+            on_end=expected_release_hook("site_prep"),
+        ),
+        Stage(
+            "waiting",
+            acquire=lambda ticket, ctx: unloading_bay,
+            release=False,
+            on_end=record_waiting,
+        ),
+        Stage(
+            "discharging",
+            lambda ticket, ctx: sample_unloading_time(
+                ticket, stochastic=UNLOAD_TIME_STOCHASTIC
+            ),
+            release=True,
+            on_end=record_unloading,
+        ),
+        Stage("cleaning", "clean_time"),
+        Stage("travel_back", "travel_time"),
+    ],
+    logger=logging.getLogger(__name__),
+    id_attr="load_number",
+)
 
-    start_time = env.now
-    stage_numb = "3"
-    stage_name = "site_prep"
-    stage_id = f"{stage_numb}_{stage_name}"
-    printer.debug(f"{name}: {stage_name}: {start_time:.2f}")
-    yield env.timeout(ticket.site_prep_time)
-    finish_site_prep = env.now
-    ticket_times[name][stage_id] = (start_time, finish_site_prep)
-    update_expected_release_time(
-        ticket, expected_release_times, waiting_times, stage_name
-    )
 
-    with unloading_bay.request() as ubr:
-        yield ubr
-
-        start_time = env.now
-        stage_numb = "4"
-        stage_name = "waiting"
-        stage_id = f"{stage_numb}_{stage_name}"
-        printer.debug(f"{name}: {stage_name}: {start_time:.2f}")
-        ticket_times[name][stage_id] = (start_time, finish_site_prep)
-        waiting_times.append(start_time - finish_site_prep)
-
-        start_time = env.now
-        stage_numb = "5"
-        stage_name = "discharging"
-        stage_id = f"{stage_numb}_{stage_name}"
-        printer.debug(f"{name}: >> {stage_name}: {start_time:.2f}")
-        yield env.timeout(
-            sample_unloading_time(ticket, stochastic=UNLOAD_TIME_STOCHASTIC)
-        )
-        ticket_times[name][stage_id] = (start_time, env.now)
-        printer.debug(f"{name}: << leaves unloading bay at {env.now:.2f}")
-        unload_times.append(env.now - start_time)
-
-    start_time = env.now
-    stage_numb = "6"
-    stage_name = "cleaning"
-    stage_id = f"{stage_numb}_{stage_name}"
-    printer.debug(f"{name}: {stage_name}: {start_time:.2f}")
-    yield env.timeout(ticket.clean_time)
-    ticket_times[name][stage_id] = (start_time, env.now)
-    # update_expected_release_time(ticket, expected_release_times, waiting_times)
-
-    start_time = env.now
-    stage_numb = "7"
-    stage_name = "travel_back"
-    stage_id = f"{stage_numb}_{stage_name}"
-    printer.debug(f"{name}: {stage_name}: {start_time:.2f}")
-    yield env.timeout(ticket.travel_time)
-    ticket_times[name][stage_id] = (start_time, env.now)
-    # update_expected_release_time(ticket, expected_release_times, waiting_times)
-
-    printer.debug(f"{name}: @ticket finished: {env.now:.2f}")
+def ticket_process(env, ticket):
+    yield from TICKET_PIPELINE.run(
+        env, ticket, records=ticket_times[ticket.load_number - 1]
+    )
+    printer.debug("%s: @ticket finished: %.2f", ticket.load_number, env.now)
 
 
 def plot_gantt(ticket_times):
     import matplotlib.dates as mdates
     from matplotlib import pyplot as plt
 
-    gdf = (
-        pd.DataFrame()
-        .from_dict(ticket_times, orient="index")
-        .stack()
-        .to_frame()
-        .reset_index()
+    gdf = TICKET_PIPELINE.to_frame(
+        ticket_times, ticket_ids=range(1, len(ticket_times) + 1)
     )
-    gdf.columns = ["ticket", "stage", "times"]
-    gdf["start"] = gdf.times.apply(lambda x: x[0])
-    gdf["end"] = gdf.times.apply(lambda x: x[1])
-    gdf.drop(columns=["times"], inplace=True)
-    gdf.ticket = gdf.ticket.astype(int)
     max_x_value = gdf.end.max()
 
     # Convert 'start' and 'end' to datetime if they aren't already
@@ -388,15 +363,10 @@ logger = logging.getLogger(__name__)
 # formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 # formatter = logging.Formatter("%(levelname)s - %(message)s")
 formatter = logging.Formatter("$ %(message)s")
-printer = configure_logger(
-    log_to_console=True,
-    log_to_file=LOG_TO_FILE,
-    filename=f'logs/{datetime.datetime.now().strftime("%Y.%m.%d_%H.%M.%S")}.log',
-    level=logging.WARNING,
-)
+printer = logger
 
 # INITIATE STATISTICS
-ticket_times = {}
+ticket_times = TICKET_PIPELINE.new_records(0)  # (load, stage code, start/end)
 waiting_times = []
 unload_times = []
 expected_release_times = {}
@@ -419,72 +389,129 @@ UNLOAD_TIME_STOCHASTIC = True
 UNLOAD_TIME_STOCHASTIC_OFFSET_FACTOR = 1.8
 UNLOAD_TIME_STOCHASTIC_SD_FACTOR = 0.5
 
-# MAKE DATA
-orderbook = generate_data(
+
+def simulate(
+    dispatching_mode=DISPATCHING_MODE,
     n_loads=N_LOADS,
     unload_time=UNLOAD_TIME,
     depot_prep_time=DEPOT_PREP_TIME,
     travel_time=TRAVEL_TIME,
     site_prep_time=SITE_PREP_TIME,
     site_clean_time=SITE_CLEAN_TIME,
-)
-tickets = create_tickets(orderbook)
-
-# ENVIRONMENT SETUP
-env = simpy.Environment()
-unloading_bay = simpy.Resource(env, capacity=1)
-# ticket = tickets[0]
-# env.process(ticket_process(env, ticket))
-if DISPATCHING_MODE == 0:
-    env.process(ticket_generator_vanilla(env, tickets))
-elif DISPATCHING_MODE == 1:
-    env.process(ticket_generator_qsize(env, tickets, unloading_bay))
-elif DISPATCHING_MODE == 2:
-    env.process(ticket_generator_estmf(env, tickets, expected_release_times))
-
-
-# RUN SIMULATION
-env.run()
-
-# REVIEW STATISTICS
-if GANTT_PLOT:
-    plot_gantt(ticket_times)
-
-total_waiting_time = sum(waiting_times)
-unload_times_rounded = [round(x, 1) for x in unload_times]
-waiting_times_rounded = [round(x, 1) for x in waiting_times]
-
-total_theoretical_time = sum(
-    orderbook["depot_prep_time"]
-    + 2 * orderbook["travel_time"]
-    + orderbook["site_prep_time"]
-    + orderbook["unload_time"]
-    + orderbook["site_clean_time"]
-)
+    seed=None,
+):
+    """
+    runs one replication of the single site dispatching model
+    statistics are kept in the module level containers (reset on every call)
+    so the function is meant to run once per process at a time
+    """
+    global env, unloading_bay, orderbook
+    global ticket_times, waiting_times, unload_times
+    global expected_release_times, expected_release_times_details
+
+    if seed is not None:
+        random.seed(seed)
+
+    # INITIATE STATISTICS
+    ticket_times = TICKET_PIPELINE.new_records(n_loads)
+    waiting_times = []
+    unload_times = []
+    expected_release_times = {}
+    expected_release_times_details = {}
+
+    # MAKE DATA
+    orderbook = generate_data(
+        n_loads=n_loads,
+        unload_time=unload_time,
+        depot_prep_time=depot_prep_time,
+        travel_time=travel_time,
+        site_prep_time=site_prep_time,
+        site_clean_time=site_clean_time,
+    )
+    tickets = create_tickets(orderbook)
+
+    # ENVIRONMENT SETUP
+    env = simpy.Environment()
+    unloading_bay = simpy.Resource(env, capacity=1)
+    # ticket = tickets[0]
+    # env.process(ticket_process(env, ticket))
+    if dispatching_mode == 0:
+        env.process(ticket_generator_vanilla(env, tickets))
+    elif dispatching_mode == 1:
+        env.process(ticket_generator_qsize(env, tickets, unloading_bay))
+    elif dispatching_mode == 2:
+        env.process(ticket_generator_estmf(env, tickets, expected_release_times))
+
+    # RUN SIMULATION
+    env.run()
+
+    return {
+        "avg_waiting_time": np.mean(waiting_times),
+        "total_waiting_time": sum(waiting_times),
+        "makespan": env.now,
+        "waiting_times": waiting_times,
+        "unload_times": unload_times,
+        "ticket_times": ticket_times,
+    }
+
+
+def avg_waiting_time(seed, **kwargs):
+    return simulate(seed=seed, **kwargs)["avg_waiting_time"]
+
+
+if __name__ == "__main__":
+    printer = configure_logger(
+        log_to_console=True,
+        log_to_file=LOG_TO_FILE,
+        filename=f'logs/{datetime.datetime.now().strftime("%Y.%m.%d_%H.%M.%S")}.log',
+        level=logging.WARNING,
+    )
+
+    simulate(dispatching_mode=DISPATCHING_MODE)
+
+    # REVIEW STATISTICS
+    if GANTT_PLOT:
+        plot_gantt(ticket_times)
 
-unload_times_theoretical = UNLOAD_TIME
-unload_times_mu = UNLOAD_TIME * UNLOAD_TIME_STOCHASTIC_OFFSET_FACTOR
-unload_times_sd = unload_times_mu * UNLOAD_TIME_STOCHASTIC_SD_FACTOR
+    total_waiting_time = sum(waiting_times)
+    unload_times_rounded = [round(x, 1) for x in unload_times]
+    waiting_times_rounded = [round(x, 1) for x in waiting_times]
 
-logger.warning("")
-logger.warning(f"Dispatching mode: {DISPATCHING_MODE}")
-logger.warning(f"Number of loads: {N_LOADS}")
-logger.warning(f"Unload times deterministic: {unload_times_theoretical} +/- 0")
-if UNLOAD_TIME_STOCHASTIC:
+    total_theoretical_time = sum(
+        orderbook["depot_prep_time"]
+        + 2 * orderbook["travel_time"]
+        + orderbook["site_prep_time"]
+        + orderbook["unload_time"]
+        + orderbook["site_clean_time"]
+    )
+
+    unload_times_theoretical = UNLOAD_TIME
+    unload_times_mu = UNLOAD_TIME * UNLOAD_TIME_STOCHASTIC_OFFSET_FACTOR
+    unload_times_sd = unload_times_mu * UNLOAD_TIME_STOCHASTIC_SD_FACTOR
+
+    logger.warning("")
+    logger.warning(f"Dispatching mode: {DISPATCHING_MODE}")
+    logger.warning(f"Number of loads: {N_LOADS}")
+    logger.warning(f"Unload times deterministic: {unload_times_theoretical} +/- 0")
+    if UNLOAD_TIME_STOCHASTIC:
+        logger.warning(
+            f"Unload times stochastic: [{unload_times_theoretical}] {unload_times_mu:.2f} +/- {unload_times_sd:.2f}"
+        )
+    logger.warning(f"Unload times: {unload_times_rounded}")
+    logger.warning(f"Waiting times: {waiting_times_rounded}")
     logger.warning(
-        f"Unload times stochastic: [{unload_times_theoretical}] {unload_times_mu:.2f} +/- {unload_times_sd:.2f}"
+        f"Avg waiting time: {np.mean(waiting_times):.2f} +/- {np.std(waiting_times):.2f}"
+    )
+    warmup_loads = mser_truncation(waiting_times, batch_size=1)
+    logger.warning(
+        f"Warm-up loads (MSER): {warmup_loads} | Avg waiting time after warm-up: {np.mean(waiting_times[warmup_loads:]):.2f}"
+    )
+    logger.warning(f"Total waiting time: {total_waiting_time:.2f}")
+    logger.warning(
+        f"Waiting % total theoretical: {total_waiting_time/total_theoretical_time:.2%}"
     )
-logger.warning(f"Unload times: {unload_times_rounded}")
-logger.warning(f"Waiting times: {waiting_times_rounded}")
-logger.warning(
-    f"Avg waiting time: {np.mean(waiting_times):.2f} +/- {np.std(waiting_times):.2f}"
-)
-logger.warning(f"Total waiting time: {total_waiting_time:.2f}")
-logger.warning(
-    f"Waiting % total theoretical: {total_waiting_time/total_theoretical_time:.2%}"
-)
 
-logger.info("")
-logger.info(expected_release_times)
-logger.info("")
-logger.info(expected_release_times_details)
+    logger.info("")
+    logger.info(expected_release_times)
+    logger.info("")
+    logger.info(expected_release_times_details)
@@ -0,0 +1,55 @@
+# run from the repository root : python -m examples.dispatching_metamodel
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from examples.dispatching import (
+    DEPOT_PREP_TIME,
+    N_LOADS,
+    SITE_PREP_TIME,
+    TRAVEL_TIME,
+    UNLOAD_TIME,
+    avg_waiting_time,
+)
+from src.metamodel import Metamodel
+
+# METAMODEL CONFIGURATION
+DESIGN_POINTS = 60
+REPLICATIONS = 5
+MAX_STD = 5.0  # MINUTES
+DISPATCHING_MODES = [0, 1, 2]
+
+SPACE = {
+    "n_loads": (5, 20, "int"),
+    "unload_time": (10, 30),
+    "travel_time": (10, 40),
+    "site_prep_time": (5, 25),
+    "depot_prep_time": (15, 45),
+}
+
+if __name__ == "__main__":
+    with ProcessPoolExecutor() as pool:
+        metamodels = {}
+        for mode in DISPATCHING_MODES:
+            t = time.perf_counter()
+            metamodels[mode] = Metamodel(
+                partial(avg_waiting_time, dispatching_mode=mode), SPACE, MAX_STD
+            ).fit(DESIGN_POINTS, REPLICATIONS, seed=mode, executor=pool)
+            print(f"Mode {mode}: fitted in {time.perf_counter() - t:.2f}s")
+
+        base = {
+            "n_loads": N_LOADS,
+            "unload_time": UNLOAD_TIME,
+            "travel_time": TRAVEL_TIME,
+            "site_prep_time": SITE_PREP_TIME,
+            "depot_prep_time": DEPOT_PREP_TIME,
+        }
+        what_if = {**base, "unload_time": UNLOAD_TIME * 1.2}
+        for mode, metamodel in metamodels.items():
+            t = time.perf_counter()
+            before = metamodel.query(base, executor=pool)
+            after = metamodel.query(what_if, executor=pool)
+            elapsed = (time.perf_counter() - t) * 1000
+            print(
+                f"Mode {mode}: avg waiting {before['mean']:.2f} +/- {before['std']:.2f} -> {after['mean']:.2f} +/- {after['std']:.2f} minutes with unload +20% ({after['source']}, {elapsed:.1f} ms)"
+            )
@@ -0,0 +1,33 @@
+# run from the repository root : python -m examples.dispatching_selection
+from functools import partial
+
+from examples.dispatching import avg_waiting_time
+from src.selection import sequential_halving
+
+# SELECTION CONFIGURATION
+BUDGET = 120
+CONFIDENCE = 0.95
+INDIFFERENCE = 1.0  # MINUTES
+N_WORKERS = None
+
+POLICIES = {
+    "vanilla": partial(avg_waiting_time, dispatching_mode=0),
+    "qsize": partial(avg_waiting_time, dispatching_mode=1),
+    "estmf": partial(avg_waiting_time, dispatching_mode=2),
+}
+
+if __name__ == "__main__":
+    result = sequential_halving(
+        POLICIES,
+        budget=BUDGET,
+        minimize=True,
+        confidence=CONFIDENCE,
+        indifference=INDIFFERENCE,
+        n_workers=N_WORKERS,
+    )
+    for name, mean in result["means"].items():
+        print(
+            f"{name}: avg waiting {mean:.2f} minutes over {result['replications'][name]} replications"
+        )
+    print(f"Replications used: {result['spent']} / {BUDGET}")
+    print(result["statement"])
@@ -1,21 +1,37 @@
 # Importing the required libraries
+# run from the repository root : python -m examples.example_atm
 import random
 
 import numpy as np
 import simpy
-from tqdm import tqdm
+
+from src.analysis import steady_state, t_interval
+from src.replication import replicate_until_precise
+from src.resultsdb import ResultsDB
+from src.vectorqueue import python_uniform_interarrivals, replicate_station
 
 RANDOM_SEED = 1990
-NO_SIMULATIONS = 50
+NO_SIMULATIONS = 200  # replication budget
+MIN_SIMULATIONS = 5
+REL_HALF_WIDTH = 0.05  # target half width of the CI relative to the mean
+CONFIDENCE = 0.95
 SIM_TIME = 24 * 60 * 60
 WARMUP_TIME = 1 * 60 * 60
+# one long run with MSER-5 warm-up and batch means : only for a stationary setup
+# (utilization < 1); the default arrival and service times give utilization 1,
+# so the terminating replications below are the design for this model
+SINGLE_RUN = False
+VECTORIZED = False  # all replications at once with the fifo recurrence
+LONG_RUN_TIME = 30 * SIM_TIME
+NO_BATCHES = 30
 CUST_INTER_ARR_MIN = 1
 CUST_INTER_ARR_MAX = 2
+SERVICE_TIME = 30 + 60  # details entered + cash retrieved
 PRINTING = False
+RESULTS_DB = "data/results.sqlite"  # None to skip storing replications
 
 thruput_simulation = []  # Throughput
-ct_replication = []  # Cycle time
-wt_replication = []  # Wait time
+customer_log = []  # (departure time, wait time, cycle time)
 ct_simulation = []
 wt_simulation = []
 
@@ -41,9 +57,9 @@ def customer(env, name, atm):
         if PRINTING:
             print(f"{name}: Cash retrieved at time: {env.now:.2f}")
 
-    if env.now > WARMUP_TIME:
-        wt_replication.append(customer_got_atm - customer_enter_time)
-        ct_replication.append(env.now - customer_enter_time)
+    customer_log.append(
+        (env.now, customer_got_atm - customer_enter_time, env.now - customer_enter_time)
+    )
 
 
 # Defining the 'customer_generator' process
@@ -60,9 +76,12 @@ def customer_generator(env, atm):
         cust_number += 1
 
 
-for r in tqdm(range(NO_SIMULATIONS)):
+def run_replication(r):
+    global customer_log
+
     # Seed for random number generator for reproducibility
     random.seed(r)
+    customer_log = []
 
     # Create an environment and start the setup process
     env = simpy.Environment()
@@ -73,20 +92,156 @@ for r in tqdm(range(NO_SIMULATIONS)):
     env.run(until=SIM_TIME)  # 10 minutes
     # break
 
-    num_customers = len(ct_replication)
-    wt_simulation.append(np.mean(wt_replication))
-    ct_simulation.append(np.mean(ct_replication))
-    thruput_simulation.append(num_customers / (SIM_TIME - WARMUP_TIME))
-
-    ct_replication = []
-    wt_replication = []
-
-print(
-    f"Average Cycle Time: {np.mean(ct_simulation)/60 :.2f} minutes +/- {np.std(ct_simulation)/60 :.2f} minutes"
-)
-print(
-    f"Average Waiting Time: {np.mean(wt_simulation)/60 :.2f} minutes +/- {np.std(wt_simulation)/60 :.2f} minutes"
-)
-print(
-    f"Average Throughput: {np.mean(thruput_simulation)*60*60 :.2f} customers/hour +/- {np.std(thruput_simulation)*60*60 :.2f} customers/hour"
-)
+    log = np.array([c for c in customer_log if c[0] > WARMUP_TIME])
+    num_customers = len(log)
+    return {
+        "wait_time": np.mean(log[:, 1]),
+        "cycle_time": np.mean(log[:, 2]),
+        "throughput": num_customers / (SIM_TIME - WARMUP_TIME),
+    }
+
+
+def run_vectorized(seeds):
+    """
+    the replications of run_replication evaluated together on numpy arrays
+    (same random streams, so the kpis match seed by seed)
+    """
+    n_customers = int(SIM_TIME / (CUST_INTER_ARR_MIN * 60)) + 1
+    interarrivals = (
+        python_uniform_interarrivals(
+            seeds, n_customers, CUST_INTER_ARR_MIN, CUST_INTER_ARR_MAX
+        )
+        * 60
+    )
+    return replicate_station(
+        interarrivals, service=SERVICE_TIME, horizon=SIM_TIME, warmup=WARMUP_TIME
+    )
+
+
+def utilization():
+    mean_inter_arrival = (CUST_INTER_ARR_MIN + CUST_INTER_ARR_MAX) / 2 * 60
+    return SERVICE_TIME / mean_inter_arrival
+
+
+def run_single(seed=RANDOM_SEED, sim_time=LONG_RUN_TIME):
+    """
+    one long run : the warm-up is detected by MSER-5 on the waiting times
+    and variance estimates come from batch means instead of replications
+    refused when the ATM has no steady state (utilization >= 1); estimates whose
+    batch means stay correlated are rejected by steady_state (strict)
+    """
+    global customer_log
+
+    if utilization() >= 1:
+        raise ValueError(
+            f"utilization {utilization():.2f} >= 1 : the queue has no steady state,"
+            " use the terminating replications (SINGLE_RUN = False)"
+        )
+
+    random.seed(seed)
+    customer_log = []
+    env = simpy.Environment()
+    atm = simpy.Resource(env, capacity=1)
+    env.process(customer_generator(env, atm))
+    env.run(until=sim_time)
+
+    departures, waits, cycles = np.array(customer_log).T
+    wait = steady_state(waits, n_batches=NO_BATCHES, confidence=CONFIDENCE, strict=True)
+    warmup_time = departures[wait["warmup"]]
+    cycle = steady_state(
+        cycles[wait["warmup"] :],
+        n_batches=NO_BATCHES,
+        confidence=CONFIDENCE,
+        strict=True,
+    )
+    hourly = np.histogram(
+        departures, bins=np.arange(0, sim_time + 1, 60 * 60), range=(0, sim_time)
+    )[0]
+    thruput = steady_state(
+        hourly, n_batches=NO_BATCHES, confidence=CONFIDENCE, strict=True
+    )
+    return {
+        "warmup_time": warmup_time,
+        "wait_time": wait,
+        "cycle_time": cycle,
+        "throughput": thruput,
+    }
+
+
+if __name__ == "__main__" and SINGLE_RUN:
+    result = run_single()
+    print(
+        f"Warm-up (MSER-5): {result['warmup_time']/60 :.2f} minutes, {NO_BATCHES} batches of {result['wait_time']['batch_size']} customers ({CONFIDENCE:.0%} CI)"
+    )
+    print(
+        f"Average Cycle Time: {result['cycle_time']['mean']/60 :.2f} minutes +/- {result['cycle_time']['half_width']/60 :.2f} minutes"
+    )
+    print(
+        f"Average Waiting Time: {result['wait_time']['mean']/60 :.2f} minutes +/- {result['wait_time']['half_width']/60 :.2f} minutes"
+    )
+    print(
+        f"Average Throughput: {result['throughput']['mean'] :.2f} customers/hour +/- {result['throughput']['half_width'] :.2f} customers/hour"
+    )
+
+elif __name__ == "__main__" and VECTORIZED:
+    result = run_vectorized(range(NO_SIMULATIONS))
+    kpis = {}
+    for kpi in ["cycle_time", "wait_time", "throughput"]:
+        mean, half_width = t_interval(result[kpi], CONFIDENCE)
+        kpis[kpi] = {"mean": mean, "half_width": half_width}
+    print(f"Replications: {NO_SIMULATIONS} (vectorized, {CONFIDENCE:.0%} CI)")
+    print(
+        f"Average Cycle Time: {kpis['cycle_time']['mean']/60 :.2f} minutes +/- {kpis['cycle_time']['half_width']/60 :.2f} minutes"
+    )
+    print(
+        f"Average Waiting Time: {kpis['wait_time']['mean']/60 :.2f} minutes +/- {kpis['wait_time']['half_width']/60 :.2f} minutes"
+    )
+    print(
+        f"Average Throughput: {kpis['throughput']['mean']*60*60 :.2f} customers/hour +/- {kpis['throughput']['half_width']*60*60 :.2f} customers/hour"
+    )
+
+elif __name__ == "__main__":
+    result = replicate_until_precise(
+        run_replication,
+        kpis=["cycle_time", "wait_time", "throughput"],
+        rel_half_width=REL_HALF_WIDTH,
+        confidence=CONFIDENCE,
+        min_reps=MIN_SIMULATIONS,
+        max_reps=NO_SIMULATIONS,
+    )
+    ct_simulation = result["samples"]["cycle_time"]
+    wt_simulation = result["samples"]["wait_time"]
+    thruput_simulation = result["samples"]["throughput"]
+    kpis = result["kpis"]
+
+    if RESULTS_DB:
+        samples = result["samples"]
+        with ResultsDB(RESULTS_DB) as db:
+            run_id = db.create_run("atm", "examples.example_atm")
+            config_id = db.config_id(
+                {
+                    "inter_arr_min": CUST_INTER_ARR_MIN,
+                    "inter_arr_max": CUST_INTER_ARR_MAX,
+                }
+            )
+            db.insert_replications(
+                run_id,
+                config_id,
+                [
+                    (seed, {kpi: values[seed] for kpi, values in samples.items()})
+                    for seed in range(result["replications"])
+                ],
+            )
+
+    print(
+        f"Replications: {result['replications']} (converged: {result['converged']}, {CONFIDENCE:.0%} CI)"
+    )
+    print(
+        f"Average Cycle Time: {kpis['cycle_time']['mean']/60 :.2f} minutes +/- {kpis['cycle_time']['half_width']/60 :.2f} minutes"
+    )
+    print(
+        f"Average Waiting Time: {kpis['wait_time']['mean']/60 :.2f} minutes +/- {kpis['wait_time']['half_width']/60 :.2f} minutes"
+    )
+    print(
+        f"Average Throughput: {kpis['throughput']['mean']*60*60 :.2f} customers/hour +/- {kpis['throughput']['half_width']*60*60 :.2f} customers/hour"
+    )
@@ -1,7 +1,12 @@
+# run from the repository root : python -m examples.example_grocery
 import random
 
+import numpy as np
 import simpy
 
+from src.analysis import steady_state
+from src.inventory import WatchedContainer, r_Q_policy, s_S_policy
+
 # GENERIC CONFIGURATION
 PRINTING = True
 RANDOM_SEED = 1990
@@ -17,13 +22,17 @@ MILK_REQUEST_MAX = 5
 NO_FRIDGES = 1
 FRIDGE_CAPACITY = 50
 FRIDGE_LEVEL = 15
-FRIDGE_REPLENISH_TIME_MIN = 10
-FRIDGE_REPLENISH_TIME_MAX = 20
 FRIDGE_REPLENISH_MIN_LEVEL = 5
 FRIDGE_REPLENISH_DURATION = 2
+# REPLENISHMENT POLICY : "sS" refills up to FRIDGE_LEVEL, "rQ" orders FRIDGE_ORDER_QUANTITY
+# as soon as the milk level (plus milk on its way) falls below FRIDGE_REPLENISH_MIN_LEVEL
+REPLENISH_POLICY = "sS"
+FRIDGE_ORDER_QUANTITY = 10
 
 # SIMULATION CONFIGURATION
 SIM_TIME = 1 * 24 * 60  # MINUTES
+NO_BATCHES = 20
+CONFIDENCE = 0.95
 # NO_SIMULATIONS = 10
 # WARMUP_TIME = 5  # MINUTES
 
@@ -32,6 +41,7 @@ SIM_TIME = 1 * 24 * 60  # MINUTES
 #     "customer_lost_iter": [],
 #     "customer_lost_experiment": [],
 # }
+customer_log = []  # (arrival time, lost)
 
 
 def customer(env, name, cashiers, fridge):
@@ -44,9 +54,11 @@ def customer(env, name, cashiers, fridge):
     with fridge["resource"].request() as fridge_req:
         res = yield fridge_req | env.timeout(CUST_PATIENCE_TIME)
         if fridge_req in res:
+            customer_log.append((env.now, 0))
             yield env.timeout(milk_required)
             yield fridge["milk_container"].get(milk_required)
         else:
+            customer_log.append((env.now, 1))
             if PRINTING:
                 print(
                     f"{name}: @@@ walked out without buying any milk at time: {env.now:.2f}"
@@ -84,25 +96,18 @@ def customer_generator(env, cashiers, fridge):
 
 
 def fridge_control_process(env, fridge):
-    while True:
-        if fridge["milk_container"].level < FRIDGE_REPLENISH_MIN_LEVEL:
-            # ! USE PROCESS AS EVENT (YIELD) TO ENSURE WAITING
-            yield env.process(fridge_refill_process(env, fridge))
-        yield env.timeout(
-            random.uniform(FRIDGE_REPLENISH_TIME_MIN, FRIDGE_REPLENISH_TIME_MAX)
+    # event triggered : wakes only when the milk in the fridge and on its way
+    # falls below FRIDGE_REPLENISH_MIN_LEVEL
+    milk = fridge["milk_container"]
+    reorder_point = FRIDGE_REPLENISH_MIN_LEVEL - 1
+    if REPLENISH_POLICY == "sS":
+        yield from s_S_policy(
+            env, milk, reorder_point, FRIDGE_LEVEL, FRIDGE_REPLENISH_DURATION
         )
-
-
-def fridge_refill_process(env, fridge):
-    if PRINTING:
-        print(f">>> FRIDGE REFILL process called at time {env.now:.2f}.")
-    yield env.timeout(FRIDGE_REPLENISH_DURATION)  # 2 minutes
-    to_refill = FRIDGE_LEVEL - fridge["milk_container"].level
-    if PRINTING:
-        print(
-            f"Fridge has {fridge['milk_container'].level}L milk. Fridge filled with {to_refill}L milk."
+    else:
+        yield from r_Q_policy(
+            env, milk, reorder_point, FRIDGE_ORDER_QUANTITY, FRIDGE_REPLENISH_DURATION
         )
-    yield fridge["milk_container"].put(to_refill)
 
 
 random.seed(RANDOM_SEED)
@@ -110,10 +115,22 @@ env = simpy.Environment()
 cashiers = simpy.Resource(env=env, capacity=NO_CASHIERS)
 fridge = {
     "resource": simpy.Resource(env=env, capacity=NO_FRIDGES),
-    "milk_container": simpy.Container(
+    "milk_container": WatchedContainer(
         env=env, capacity=FRIDGE_CAPACITY, init=FRIDGE_LEVEL
     ),
 }
 env.process(customer_generator(env=env, cashiers=cashiers, fridge=fridge))
 env.process(fridge_control_process(env=env, fridge=fridge))
 env.run(until=SIM_TIME)  # 10 minutes
+
+# REVIEW STATISTICS : MSER-5 warm-up and batch means on the lost customer indicator
+lost = steady_state(
+    np.array([c[1] for c in customer_log]), n_batches=NO_BATCHES, confidence=CONFIDENCE
+)
+print(
+    f"Lost customers: {lost['mean']:.2%} +/- {lost['half_width']:.2%} ({CONFIDENCE:.0%} CI, warm-up: {lost['warmup']} customers)"
+)
+milk = fridge["milk_container"].stats()
+print(
+    f"Milk in fridge: {milk['mean_level']:.2f}L on average, empty {milk['stockout_fraction']:.2%} of the time, {milk['orders']} refills"
+)
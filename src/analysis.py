@@ -0,0 +1,172 @@
+"""
+here goes output analysis for simulation runs : traces and kpis
+"""
+
+import warnings
+from dataclasses import asdict
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from src.simobj import Order, Ticket
+
+
+class NonStationaryWarning(UserWarning):
+    pass
+
+
+def trace_to_frame(trace: List[Ticket]) -> pd.DataFrame:
+    return pd.DataFrame([asdict(ticket) for ticket in trace])
+
+
+def ticket_kpis(trace: pd.DataFrame, n_tickets: int = None) -> dict:
+    """
+    summarize a ticket trace (see trace_to_frame) into run level kpis
+    times are in simulation minutes
+    n_tickets is the number of scheduled tickets; those missing from the trace
+    never finished and count as late
+    """
+    unfinished = 0 if n_tickets is None else n_tickets - len(trace)
+    if trace.empty:
+        return {
+            "tickets": 0,
+            "unfinished": unfinished,
+            "late_tickets": unfinished,
+            "on_time_rate": 0.0 if unfinished else np.nan,
+            "avg_lateness": np.nan,
+            "avg_queue_wait": np.nan,
+            "makespan": np.nan,
+        }
+    lateness = (trace["sim_ticket_arrive_time"] - trace["ticket_arrive_time"]).clip(
+        lower=0
+    )
+    queue_wait = trace["sim_ticket_start_time"] - trace["sim_enter_queue_time"]
+    finish_time = (
+        trace["sim_ticket_arrive_time"]
+        + trace["sim_unload_mins"]
+        + trace["sim_site_clean_mins"]
+        + trace["sim_travel_back_mins"]
+    )
+    late_tickets = int((lateness > 0).sum()) + unfinished
+    return {
+        "tickets": len(trace),
+        "unfinished": unfinished,
+        "late_tickets": late_tickets,
+        "on_time_rate": float(1 - late_tickets / (len(trace) + unfinished)),
+        "avg_lateness": float(lateness.mean()),
+        "avg_queue_wait": float(queue_wait.mean()),
+        "makespan": float(finish_time.max()),
+    }
+
+
+def order_kpis(orders: List[Order]) -> pd.DataFrame:
+    """
+    one row per order from the counters kept during the run (no ticket scan)
+    """
+    return pd.DataFrame(
+        [
+            {
+                "order_id": order.order_id,
+                "n_loads": order.n_loads,
+                "delivered": order.n_unloaded,
+                "cancelled": order.n_cancelled,
+                "finished": order.is_finished,
+                "progress": order.progress,
+                "late_loads": order.n_late,
+                "avg_lateness": order.total_lateness / order.n_arrived
+                if order.n_arrived
+                else np.nan,
+                "first_arrive_delay": order.first_arrive_time - order.due_time_mins
+                if order.first_arrive_time is not None
+                else np.nan,
+                "pour_end_time": order.last_unload_end_time,
+            }
+            for order in orders
+        ]
+    )
+
+
+def t_interval(values, confidence=0.95):
+    """
+    student-t confidence interval for the mean of independent replications
+    returns (mean, half_width)
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = values.mean()
+    if n < 2:
+        return mean, np.inf
+    # scipy is imported on first use : it dominates the import time of this module
+    from scipy import stats
+
+    t = stats.t.ppf((1 + confidence) / 2, n - 1)
+    return mean, t * values.std(ddof=1) / np.sqrt(n)
+
+
+def mser_truncation(series, batch_size=5, max_fraction=0.5) -> int:
+    """
+    warm-up truncation point by MSER-batch_size (MSER-5 by default)
+    the series is averaged in batches and the truncation d minimizing
+    var(remaining) / (n - d) is searched over the first max_fraction of batches
+    returns the number of raw observations to discard
+    """
+    y = np.asarray(series, dtype=float)
+    n_batches = len(y) // batch_size
+    if n_batches < 2:
+        return 0
+    z = y[: n_batches * batch_size].reshape(n_batches, batch_size).mean(axis=1)
+    # sums over z[d:] for every d
+    tail_sum = np.cumsum(z[::-1])[::-1]
+    tail_sq_sum = np.cumsum(z[::-1] ** 2)[::-1]
+    remaining = np.arange(n_batches, 0, -1)
+    mser = (tail_sq_sum - tail_sum**2 / remaining) / remaining**2
+    limit = int(n_batches * max_fraction)
+    return int(np.argmin(mser[: limit + 1])) * batch_size
+
+
+def batch_means(series, n_batches=20, confidence=0.95) -> dict:
+    """
+    confidence interval for the steady state mean of one long (truncated) run
+    leftover observations are dropped from the front of the series
+    a large lag1_autocorrelation means the batches are too small
+    """
+    y = np.asarray(series, dtype=float)
+    size = len(y) // n_batches
+    if size == 0:
+        raise ValueError(f"{len(y)} observations cannot fill {n_batches} batches")
+    means = y[len(y) - size * n_batches :].reshape(n_batches, size).mean(axis=1)
+    mean, half_width = t_interval(means, confidence)
+    lag1 = np.nan
+    if n_batches > 2 and means.std() > 0:
+        lag1 = np.corrcoef(means[:-1], means[1:])[0, 1]
+    return {
+        "mean": mean,
+        "half_width": half_width,
+        "batch_size": size,
+        "lag1_autocorrelation": lag1,
+    }
+
+
+def steady_state(
+    series, n_batches=20, confidence=0.95, batch_size=5, max_lag1=0.5, strict=False
+) -> dict:
+    """
+    MSER truncation followed by batch means on the remaining observations
+    only meaningful for models with a stationary regime (e.g. utilization < 1)
+    batch means correlated beyond max_lag1 mean the run is too short or not
+    stationary : warn (NonStationaryWarning), or raise ValueError when strict
+    """
+    warmup = mser_truncation(series, batch_size=batch_size)
+    result = batch_means(series[warmup:], n_batches=n_batches, confidence=confidence)
+    result["warmup"] = warmup
+    result["stationary"] = not result["lag1_autocorrelation"] > max_lag1
+    if not result["stationary"]:
+        message = (
+            f"batch means lag-1 autocorrelation {result['lag1_autocorrelation']:.2f}"
+            f" > {max_lag1}; the steady state estimate is not reliable"
+        )
+        if strict:
+            raise ValueError(message)
+        warnings.warn(message, NonStationaryWarning, stacklevel=2)
+    return result
@@ -0,0 +1,227 @@
+"""
+scenario broadcast to replication workers over shared memory
+the column arrays of the scenario frames (orders, tickets, depots, trucks) are
+copied once into a single shared memory block; tasks only carry a small
+ScenarioHandle (block name + column layout), so the per task pickling cost does
+not grow with the scenario. workers attach once per process and rebuild the
+frames from the buffer (numeric columns are zero-copy views)
+
+column kinds : numeric / bool arrays as is, datetimes as int64, strings as fixed
+width utf-8 bytes, any other object column as one pickled blob. nullable
+extension columns (Int64, Float64, boolean) become plain numpy arrays : their
+numpy dtype, or float64 with NaN when values are missing (boolean with missing
+values goes as a blob)
+
+the block belongs to the ScenarioBroadcast that created it : close() (or leaving
+the with block, or garbage collection) unlinks it, and multiprocessing's resource
+tracker unlinks it if the creating process dies without cleaning up
+"""
+
+import pickle
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from src.simobj import SimEngine
+
+ALIGN = 64
+MAX_ATTACHED = 4
+
+# attached blocks of this (worker) process : name -> (shared memory, frames)
+_attached = {}
+
+
+@dataclass(frozen=True)
+class ColumnLayout:
+    table: str
+    column: str
+    kind: str  # "array", "datetime", "str" or "blob"
+    dtype: str
+    offset: int
+    nbytes: int
+    length: int
+
+
+@dataclass(frozen=True)
+class ScenarioHandle:
+    name: str
+    layout: Tuple[ColumnLayout, ...]
+    tables: Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def _nullable_dtype(values: pd.Series):
+    """
+    numpy dtype holding a nullable extension column (Int64, Float64, boolean),
+    None when there is no plain numpy equivalent
+    """
+    dtype = getattr(values.dtype, "numpy_dtype", None)
+    if dtype is None or not values.isna().any():
+        return dtype
+    if dtype.kind == "b":
+        return None
+    return np.result_type(dtype, np.float64)
+
+
+def _encode(values: pd.Series) -> Tuple[str, np.ndarray]:
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return "datetime", values.to_numpy().astype("datetime64[ns]").view(np.int64)
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+        dtype = _nullable_dtype(values)
+        if dtype is not None:
+            return "array", values.to_numpy(dtype=dtype, na_value=np.nan)
+    elif pd.api.types.is_numeric_dtype(values.dtype) or values.dtype == bool:
+        return "array", np.ascontiguousarray(values.to_numpy())
+    if values.map(lambda v: isinstance(v, str)).all():
+        encoded = np.array([v.encode("utf-8") for v in values], dtype=bytes)
+        return "str", encoded
+    blob = pickle.dumps(values.tolist(), protocol=pickle.HIGHEST_PROTOCOL)
+    return "blob", np.frombuffer(blob, dtype=np.uint8)
+
+
+def _decode(buf, col: ColumnLayout):
+    if col.kind == "blob":
+        return pickle.loads(buf[col.offset : col.offset + col.nbytes])
+    array = np.ndarray(
+        (col.length,), dtype=np.dtype(col.dtype), buffer=buf, offset=col.offset
+    )
+    if col.kind == "datetime":
+        return array.view("datetime64[ns]")
+    if col.kind == "str":
+        return np.char.decode(array, "utf-8").astype(object)
+    array.flags.writeable = False
+    return array
+
+
+class ScenarioBroadcast:
+    """
+    places the scenario frames in shared memory
+    use as a context manager around the pool that runs the tasks
+    """
+
+    def __init__(self, data: Dict[str, pd.DataFrame]):
+        encoded, tables, size = [], [], 0
+        for table, frame in data.items():
+            tables.append((table, tuple(frame.columns)))
+            for column in frame.columns:
+                kind, array = _encode(frame[column])
+                size = -(-size // ALIGN) * ALIGN
+                encoded.append((table, column, kind, array, size))
+                size += array.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        layout = []
+        for table, column, kind, array, offset in encoded:
+            target = np.ndarray(
+                array.shape, dtype=array.dtype, buffer=self.shm.buf, offset=offset
+            )
+            target[:] = array
+            layout.append(
+                ColumnLayout(
+                    table,
+                    column,
+                    kind,
+                    array.dtype.str,
+                    offset,
+                    array.nbytes,
+                    len(data[table]),
+                )
+            )
+            del target
+        self.handle = ScenarioHandle(self.shm.name, tuple(layout), tuple(tables))
+        self._finalizer = weakref.finalize(self, _release, self.shm)
+
+    def close(self) -> None:
+        self._finalizer()
+
+    def __enter__(self) -> ScenarioHandle:
+        return self.handle
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _release(shm: shared_memory.SharedMemory) -> None:
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def attach(handle: ScenarioHandle) -> Dict[str, pd.DataFrame]:
+    """
+    scenario frames from the broadcast block (attached once per process, at most
+    MAX_ATTACHED blocks, the least recently used one is detached first)
+    the frames share read-only memory : copy a frame before modifying it
+    """
+    if handle.name in _attached:
+        _attached[handle.name] = _attached.pop(handle.name)
+    else:
+        while len(_attached) >= MAX_ATTACHED:
+            _detach(next(iter(_attached)))
+        shm = shared_memory.SharedMemory(name=handle.name)
+        columns = {(col.table, col.column): col for col in handle.layout}
+        frames = {
+            table: pd.DataFrame(
+                {name: _decode(shm.buf, columns[(table, name)]) for name in names},
+                copy=False,
+            )
+            for table, names in handle.tables
+        }
+        _attached[handle.name] = (shm, frames)
+    return _attached[handle.name][1]
+
+
+def _detach(name: str) -> None:
+    shm, frames = _attached.pop(name, (None, None))
+    if shm is not None:
+        del frames
+        try:
+            shm.close()
+        except BufferError:
+            # frames still referenced elsewhere : the mapping goes with them
+            pass
+
+
+def detach(handle: ScenarioHandle) -> None:
+    _detach(handle.name)
+
+
+def build_engine(frames: Dict[str, pd.DataFrame], env=None, **kwargs) -> SimEngine:
+    return SimEngine(
+        env=env or simpy.Environment(),
+        orderlist=frames["orders"],
+        ticketlist=frames["tickets"],
+        depotlist=frames["depots"],
+        trucklist=frames["trucks"],
+        **kwargs,
+    )
+
+
+def _scenario_task(task):
+    handle, model, seed = task
+    return model(attach(handle), seed)
+
+
+def replicate_scenario(
+    data: Dict[str, pd.DataFrame],
+    model: Callable[[Dict[str, pd.DataFrame], int], object],
+    seeds: Iterable[int],
+    n_workers: int = None,
+    executor: Executor = None,
+) -> List[object]:
+    """
+    run model(frames, seed) for every seed with the scenario broadcast once
+    results come back in seed order
+    """
+    with ScenarioBroadcast(data) as handle:
+        tasks = [(handle, model, seed) for seed in seeds]
+        if executor is not None:
+            return list(executor.map(_scenario_task, tasks))
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            return list(pool.map(_scenario_task, tasks))
@@ -0,0 +1,294 @@
+"""
+command line entry point : python -m src <command>
+
+    generate   write a generated day (orders, tickets, depots, trucks) as csv files
+    run        simulate one day and print its kpis
+    replicate  replicate a day over seeds in a process pool, kpi means and intervals
+    sweep      replicate every fleet size of a list over the same seeds
+               (one run per fleet size for a day loaded with --data)
+    imports    check the import time of the cli and worker modules against a budget
+
+this module only imports the standard library : pandas, simpy, scipy and faker
+are imported inside the commands that need them, so short jobs and replication
+workers (which unpickle the model from here) only pay for what they use
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+TABLES = ["orders", "tickets", "depots", "trucks"]
+KPIS = ["on_time_rate", "avg_lateness", "avg_queue_wait", "makespan"]
+
+# modules that must not be loaded by importing the cli
+HEAVY_MODULES = ["pandas", "numpy", "scipy", "simpy", "faker", "matplotlib", "tqdm"]
+# fresh interpreter import budget in seconds : the cli, and what a worker needs
+IMPORT_BUDGET = {"src.cli": 0.15, "src.simobj": 0.8, "src.replication": 0.8}
+
+
+def load_data(directory) -> dict:
+    import pandas as pd
+
+    directory = Path(directory)
+    return {table: pd.read_csv(directory / f"{table}.csv") for table in TABLES}
+
+
+def resize_fleet(trucklist, trucks: int):
+    """
+    fleet of trucks trucks with the home depot shares of trucklist
+    """
+    from src.fleetsizing import make_trucks, split_fleet
+
+    shares = trucklist["home_depot"].value_counts().to_dict()
+    return make_trucks(trucks, split_fleet(trucks, shares))
+
+
+def make_data(seed=None, data_dir=None, trucks=None, **scenario) -> dict:
+    """
+    the day of a run : read from data_dir (seed is then irrelevant, the day is
+    deterministic), or generated for seed; trucks resizes the fleet of either
+    """
+    if data_dir is not None:
+        data = load_data(data_dir)
+        if trucks is not None:
+            data["trucks"] = resize_fleet(data["trucks"], trucks)
+        return data
+    import random
+
+    from src.datagen import generate_data
+
+    if seed is not None:
+        random.seed(seed)
+    return generate_data(number_of_trucks=trucks, **scenario)
+
+
+def simulate(data: dict) -> dict:
+    import simpy
+
+    from src.analysis import ticket_kpis, trace_to_frame
+    from src.simobj import SimEngine
+
+    se = SimEngine(
+        env=simpy.Environment(),
+        orderlist=data["orders"],
+        ticketlist=data["tickets"],
+        depotlist=data["depots"],
+        trucklist=data["trucks"],
+    )
+    se.run()
+    return ticket_kpis(trace_to_frame(se.trace), n_tickets=len(data["tickets"]))
+
+
+def day_kpis(seed, **scenario) -> dict:
+    """
+    replication model : one simulated day for seed
+    """
+    return simulate(make_data(seed, **scenario))
+
+
+def _scenario(args) -> dict:
+    scenario = {"trucks": args.trucks, "data_dir": args.data}
+    if args.data is None:
+        scenario.update(
+            min_orders=args.min_orders,
+            max_orders=args.max_orders,
+            number_of_depots=args.depots,
+        )
+    return scenario
+
+
+def _summary(results, kpis=KPIS) -> dict:
+    from src.analysis import t_interval
+
+    summary = {}
+    for kpi in kpis:
+        mean, half_width = t_interval([r[kpi] for r in results])
+        summary[kpi] = float(mean)
+        summary[f"{kpi}_hw"] = float(half_width)
+    return summary
+
+
+def _print(rows, as_json=False) -> None:
+    if as_json:
+        print(json.dumps(rows, indent=2, default=float))
+        return
+    for row in rows if isinstance(rows, list) else [rows]:
+        print(
+            "  ".join(
+                f"{key}={round(value, 4) if isinstance(value, float) else value}"
+                for key, value in row.items()
+            )
+        )
+
+
+def cmd_generate(args) -> int:
+    data = make_data(args.seed, **_scenario(args))
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    for table in TABLES:
+        data[table].to_csv(out / f"{table}.csv", index=False)
+    print(f"{len(data['tickets'])} tickets written to {out}")
+    return 0
+
+
+def cmd_run(args) -> int:
+    started = time.perf_counter()
+    kpis = day_kpis(args.seed, **_scenario(args))
+    kpis["elapsed_s"] = round(time.perf_counter() - started, 3)
+    _print(kpis, args.json)
+    return 0
+
+
+def cmd_replicate(args) -> int:
+    from src.replication import run_replications
+
+    seeds = range(args.first_seed, args.first_seed + args.reps)
+    model = partial(day_kpis, **_scenario(args))
+    results = run_replications(model, seeds, n_workers=args.workers)
+    _print({"replications": args.reps, **_summary(results)}, args.json)
+    return 0
+
+
+def cmd_sweep(args) -> int:
+    from src.replication import run_tasks
+
+    if args.data is not None:
+        # a loaded day is deterministic : one run per fleet size
+        args.reps = 1
+    seeds = range(args.first_seed, args.first_seed + args.reps)
+    scenario = _scenario(args)
+    tasks = [
+        (partial(day_kpis, **{**scenario, "trucks": trucks}), seed)
+        for trucks in args.fleet
+        for seed in seeds
+    ]
+    results = run_tasks(tasks, n_workers=args.workers)
+    rows = []
+    for k, trucks in enumerate(args.fleet):
+        if args.data is not None:
+            rows.append({"trucks": trucks, **{kpi: results[k][kpi] for kpi in KPIS}})
+            continue
+        summary = _summary(results[k * args.reps : (k + 1) * args.reps])
+        rows.append({"trucks": trucks, **summary})
+    _print(rows, args.json)
+    return 0
+
+
+def import_cost(module: str) -> dict:
+    """
+    import time of module in a fresh interpreter and the heavy modules it loads
+    """
+    code = (
+        "import sys, time, json\n"
+        "t = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - t\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': elapsed, 'heavy': heavy}))\n"
+    )
+    cwd = Path(__file__).resolve().parent.parent
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def check_import_budget(budget: dict = None, repeat: int = 3) -> list:
+    """
+    best of repeat fresh imports per module against its budget in seconds
+    the cli itself must not load any of HEAVY_MODULES
+    """
+    rows = []
+    for module, limit in (budget or IMPORT_BUDGET).items():
+        costs = [import_cost(module) for _ in range(repeat)]
+        seconds = min(cost["seconds"] for cost in costs)
+        heavy = costs[0]["heavy"]
+        ok = seconds <= limit and (module != "src.cli" or not heavy)
+        rows.append(
+            {
+                "module": module,
+                "seconds": round(seconds, 3),
+                "budget": limit,
+                "heavy": ",".join(heavy) or "-",
+                "ok": ok,
+            }
+        )
+    return rows
+
+
+def cmd_imports(args) -> int:
+    budget = dict(IMPORT_BUDGET)
+    for module in args.module or []:
+        budget[module] = args.budget
+    rows = check_import_budget(budget, args.repeat)
+    _print(rows, args.json)
+    return 0 if all(row["ok"] for row in rows) else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src", description="simulation of ready mix deliveries"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    day = argparse.ArgumentParser(add_help=False)
+    day.add_argument("--data", help="directory of csv files written by generate")
+    day.add_argument("--trucks", type=int, help="fleet size (resizes a loaded day)")
+    day.add_argument("--min-orders", type=int, default=5)
+    day.add_argument("--max-orders", type=int, default=10)
+    day.add_argument("--depots", type=int, default=4)
+    day.add_argument("--json", action="store_true", help="print json")
+
+    reps = argparse.ArgumentParser(add_help=False)
+    reps.add_argument("--reps", type=int, default=10)
+    reps.add_argument("--first-seed", type=int, default=0)
+    reps.add_argument("--workers", type=int)
+
+    generate = commands.add_parser(
+        "generate", parents=[day], help="write a generated day"
+    )
+    generate.add_argument("--seed", type=int)
+    generate.add_argument("--out", default="data/day")
+    generate.set_defaults(func=cmd_generate)
+
+    run = commands.add_parser("run", parents=[day], help="simulate one day")
+    run.add_argument("--seed", type=int)
+    run.set_defaults(func=cmd_run)
+
+    replicate = commands.add_parser(
+        "replicate", parents=[day, reps], help="replicate a day over seeds"
+    )
+    replicate.set_defaults(func=cmd_replicate)
+
+    sweep = commands.add_parser(
+        "sweep", parents=[day, reps], help="replicate several fleet sizes"
+    )
+    sweep.add_argument("--fleet", type=int, nargs="+", required=True)
+    sweep.set_defaults(func=cmd_sweep)
+
+    imports = commands.add_parser("imports", help="check the import time budget")
+    imports.add_argument("--module", action="append", help="extra module to check")
+    imports.add_argument("--budget", type=float, default=1.0, help="for --module")
+    imports.add_argument("--repeat", type=int, default=3)
+    imports.add_argument("--json", action="store_true", help="print json")
+    imports.set_defaults(func=cmd_imports)
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "replicate" and args.data is not None:
+        parser.error(
+            "replicate --data : a loaded day is deterministic, every replication "
+            "would be the same; replicate generated days or use run"
+        )
+    return args.func(args)
@@ -2,7 +2,6 @@ import math
 import random
 
 import pandas as pd
-from faker import Faker
 
 
 def haversine(lat1, lon1, lat2, lon2):
@@ -121,6 +120,8 @@ def generate_data(
             "lon_min": -80.00,
             "lon_max": -80.40,
         }
+    from faker import Faker
+
     fake = Faker()
     quantities = generate_quantities(min_orders, max_orders)
     # print(quantities)
@@ -0,0 +1,167 @@
+"""
+fleet sizing on top of SimEngine
+finds the smallest number of trucks whose on-time rate meets a service level,
+assuming the kpi does not get worse when trucks are added (monotone search)
+every candidate fleet is replicated over the same seeds (common random numbers)
+"""
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from src.analysis import ticket_kpis, trace_to_frame
+from src.datagen import generate_data
+from src.replication import run_tasks
+from src.simobj import SimEngine
+
+
+def split_fleet(number_of_trucks, split):
+    """
+    turn depot shares into truck counts per depot (largest remainder rounding)
+    """
+    depots = list(split)
+    shares = np.array([split[d] for d in depots], dtype=float)
+    quotas = number_of_trucks * shares / shares.sum()
+    counts = np.floor(quotas).astype(int)
+    remainder = number_of_trucks - counts.sum()
+    for k in np.argsort(counts - quotas)[:remainder]:
+        counts[k] += 1
+    return dict(zip(depots, counts))
+
+
+def make_trucks(number_of_trucks, home_depots, clock_in_time=1, clock_out_time=17):
+    trucks = []
+    t = 1
+    for depot_id, count in home_depots.items():
+        for _ in range(count):
+            trucks.append(
+                {
+                    "truck_id": f"truck_{t:02}",
+                    "home_depot": depot_id,
+                    "clock_in_time": clock_in_time,
+                    "clock_out_time": clock_out_time,
+                }
+            )
+            t += 1
+    return pd.DataFrame(trucks)
+
+
+def fleet_kpis(seed, number_of_trucks, split=None, scenario=None):
+    """
+    one replication : generate the day for seed and simulate it with the given fleet
+    split is None (random home depots), "demand" (shares of tickets per depot)
+    or a dict of depot shares
+    """
+    random.seed(seed)
+    data = generate_data(number_of_trucks=number_of_trucks, **(scenario or {}))
+    if split == "demand":
+        split = data["tickets"]["ship_loc"].value_counts().to_dict()
+    if split is not None:
+        home_depots = split_fleet(number_of_trucks, split)
+        data["trucks"] = make_trucks(number_of_trucks, home_depots)
+
+    env = simpy.Environment()
+    se = SimEngine(
+        env=env,
+        orderlist=data["orders"],
+        ticketlist=data["tickets"],
+        depotlist=data["depots"],
+        trucklist=data["trucks"],
+    )
+    se.run()
+    return ticket_kpis(trace_to_frame(se.trace), n_tickets=len(data["tickets"]))
+
+
+def lower_bound(values, confidence=0.95):
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 2:
+        return -np.inf
+    from scipy import stats
+
+    return values.mean() - stats.t.ppf(confidence, n - 1) * values.std(
+        ddof=1
+    ) / np.sqrt(n)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def min_fleet_size(
+    target=0.95,
+    kpi="on_time_rate",
+    lo=1,
+    hi=None,
+    max_trucks=1_000,
+    replications=10,
+    confidence=0.95,
+    split=None,
+    scenario=None,
+    n_workers=None,
+    cache=None,
+) -> dict:
+    """
+    smallest fleet whose one-sided lower confidence bound on kpi reaches target
+    hi defaults to a doubling search starting from lo, capped at max_trucks
+    cache maps (split, scenario, number_of_trucks, seed) -> kpis (all of them, so
+    any kpi can be searched) and is filled in place, pass the same dict again to
+    reuse runs from an earlier search
+    """
+    cache = {} if cache is None else cache
+    seeds = range(replications)
+    evaluated = {}
+    model_key = (_freeze(split), _freeze(scenario or {}))
+
+    def evaluate(pool, number_of_trucks):
+        key = model_key + (number_of_trucks,)
+        missing = [s for s in seeds if key + (s,) not in cache]
+        model = partial(
+            fleet_kpis,
+            number_of_trucks=number_of_trucks,
+            split=split,
+            scenario=scenario,
+        )
+        for s, result in zip(
+            missing, run_tasks([(model, s) for s in missing], executor=pool)
+        ):
+            cache[key + (s,)] = result
+        values = [cache[key + (s,)][kpi] for s in seeds]
+        bound = float(lower_bound(values, confidence))
+        evaluated[number_of_trucks] = {"mean": float(np.mean(values)), "lower": bound}
+        return bound >= target
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        if hi is None:
+            hi = max(lo, 1)
+            while not evaluate(pool, hi):
+                if hi >= max_trucks:
+                    return {"fleet_size": None, "evaluated": evaluated, "cache": cache}
+                lo = hi + 1
+                hi = min(2 * hi, max_trucks)
+        elif not evaluate(pool, hi):
+            return {"fleet_size": None, "evaluated": evaluated, "cache": cache}
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if evaluate(pool, mid):
+                hi = mid
+            else:
+                lo = mid + 1
+
+    return {
+        "fleet_size": hi,
+        "mean": evaluated[hi]["mean"],
+        "lower_bound": evaluated[hi]["lower"],
+        "confidence": confidence,
+        "evaluated": evaluated,
+        "cache": cache,
+    }
@@ -0,0 +1,214 @@
+"""
+incremental re-simulation of a day plan
+trucks only move between the depots a ticket ships from and returns to, so depots
+linked by those legs form independent regions (union-find); trucks are
+interchangeable, so the state of a region is fully known at any quiescent instant
+(no ticket queued or in progress : only yard counts per depot)
+
+a changed order re-simulates only the regions its tickets touch, restarting from
+the last quiescent instant of the previous run before the change; the kept prefix
+and the new suffix together match a full re-run (see verify)
+"""
+
+from typing import Dict, FrozenSet, List
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from src.analysis import trace_to_frame
+from src.sharding import _find, _union
+from src.simobj import SimEngine
+
+SIM_COLUMNS = [
+    "sim_enter_queue_time",
+    "sim_ticket_start_time",
+    "sim_ticket_arrive_time",
+    "sim_load_mins",
+    "sim_travel_to_mins",
+    "sim_site_prep_mins",
+    "sim_unload_mins",
+    "sim_site_clean_mins",
+    "sim_travel_back_mins",
+]
+
+
+def dependency_regions(data: Dict[str, pd.DataFrame]) -> List[FrozenSet[str]]:
+    """
+    sets of depots linked by ticket legs (ship_loc -> return_loc)
+    """
+    parent = {depot_id: depot_id for depot_id in data["depots"]["depot_id"]}
+    tickets = data["tickets"]
+    for ship_loc, return_loc in zip(tickets["ship_loc"], tickets["return_loc"]):
+        _union(parent, ship_loc, return_loc)
+    regions = {}
+    for depot_id in parent:
+        regions.setdefault(_find(parent, depot_id), set()).add(depot_id)
+    return [frozenset(depots) for depots in regions.values()]
+
+
+def park_times(trace: pd.DataFrame) -> pd.Series:
+    return (
+        trace["sim_ticket_arrive_time"]
+        + trace["sim_unload_mins"]
+        + trace["sim_site_clean_mins"]
+        + trace["sim_travel_back_mins"]
+    )
+
+
+def quiescent_time(tickets: pd.DataFrame, trace: pd.DataFrame, change_time) -> float:
+    """
+    latest instant <= change_time at which no ticket of the region was queued or
+    in progress in the previous run (0 when there is none)
+    """
+    finished = trace.set_index("ticket_id")
+    enter = tickets["ticket_start_time"].to_numpy(dtype=float)
+    park = (
+        park_times(finished)
+        .reindex(tickets["ticket_id"])
+        .to_numpy(dtype=float, na_value=np.inf)
+    )
+    order = np.argsort(enter, kind="stable")
+    busy_until = -np.inf
+    restart = 0.0
+    for start, end in zip(enter[order], park[order]):
+        if start > change_time:
+            break
+        if start >= busy_until:
+            # idle just before start : the region is quiescent at start
+            restart = start
+        busy_until = max(busy_until, end)
+    if busy_until <= change_time:
+        restart = change_time
+    return float(restart)
+
+
+class IncrementalPlanner:
+    """
+    keeps the simulated trace of a day plan per dependency region and updates it
+    as orders are added, re-timed or cancelled
+    """
+
+    def __init__(self, data: Dict[str, pd.DataFrame]):
+        self.data = {name: frame.reset_index(drop=True) for name, frame in data.items()}
+        self.traces: Dict[FrozenSet[str], pd.DataFrame] = {}
+        self.resimulated = []
+        for region in dependency_regions(self.data):
+            self.traces[region] = self._simulate(region, 0.0, None)
+
+    def _region_data(self, region):
+        tickets = self.data["tickets"]
+        tickets = tickets[tickets["ship_loc"].isin(region)]
+        orders = self.data["orders"]
+        return orders[orders["order_id"].isin(tickets["order_id"])], tickets
+
+    def _simulate(self, region, restart, previous: pd.DataFrame):
+        """
+        simulate a region from the quiescent instant restart, keeping the previous
+        trace before it
+        """
+        orders, tickets = self._region_data(region)
+        trucks = self.data["trucks"]
+        trucks = trucks[trucks["home_depot"].isin(region)].copy()
+        kept = None
+        if previous is not None and restart > 0:
+            kept = previous[previous["sim_enter_queue_time"] < restart]
+            # yard counts at restart : trucks left ship_loc and parked at return_loc
+            yard = trucks["home_depot"].value_counts()
+            yard = yard.add(kept["return_loc"].value_counts(), fill_value=0)
+            yard = yard.sub(kept["ship_loc"].value_counts(), fill_value=0)
+            homes = [d for d, n in yard.astype(int).items() for _ in range(n)]
+            trucks["home_depot"] = homes
+            tickets = tickets[tickets["ticket_start_time"] >= restart]
+            self.resimulated.append((sorted(region), restart, len(tickets)))
+        else:
+            self.resimulated.append((sorted(region), 0.0, len(tickets)))
+        depots = self.data["depots"]
+        se = SimEngine(
+            env=simpy.Environment(initial_time=restart),
+            orderlist=orders,
+            ticketlist=tickets,
+            depotlist=depots[depots["depot_id"].isin(region)],
+            trucklist=trucks,
+        )
+        se.run()
+        trace = trace_to_frame(se.trace)
+        if kept is not None and not kept.empty:
+            trace = pd.concat([kept, trace], ignore_index=True)
+        return trace
+
+    def _apply(self, order_id, order_row=None, ticket_rows=None):
+        tickets = self.data["tickets"]
+        old = tickets[tickets["order_id"] == order_id]
+        new = pd.DataFrame(ticket_rows) if ticket_rows is not None else old.iloc[:0]
+        changed = pd.concat([old, new])
+        change_time = changed["ticket_start_time"].min() if len(changed) else np.inf
+
+        orders = self.data["orders"]
+        orders = orders[orders["order_id"] != order_id]
+        if order_row is not None:
+            orders = pd.concat([orders, pd.DataFrame([order_row])], ignore_index=True)
+        self.data["orders"] = orders
+        self.data["tickets"] = pd.concat(
+            [tickets[tickets["order_id"] != order_id], new], ignore_index=True
+        )
+
+        touched = set(changed["ship_loc"]) | set(changed["return_loc"])
+        traces = {}
+        for region in dependency_regions(self.data):
+            if not region & touched and region in self.traces:
+                traces[region] = self.traces[region]
+            elif region in self.traces:
+                previous = self.traces[region]
+                previous = previous[previous["order_id"] != order_id]
+                _, region_tickets = self._region_data(region)
+                restart = quiescent_time(region_tickets, previous, change_time)
+                traces[region] = self._simulate(region, restart, previous)
+            else:
+                # regions merged or split by the change : simulate from the start
+                traces[region] = self._simulate(region, 0.0, None)
+        self.traces = traces
+
+    def upsert_order(self, order_row: dict, ticket_rows: List[dict]) -> None:
+        """
+        add an order, or replace an existing one (e.g. re-timed tickets)
+        """
+        self._apply(order_row["order_id"], order_row, ticket_rows)
+
+    def cancel_order(self, order_id: str) -> None:
+        self._apply(order_id)
+
+    def trace(self) -> pd.DataFrame:
+        traces = [t for t in self.traces.values() if not t.empty]
+        if not traces:
+            return pd.DataFrame()
+        trace = pd.concat(traces, ignore_index=True)
+        return trace.sort_values("ticket_id", ignore_index=True)
+
+    def verify(self, atol=1e-9) -> bool:
+        """
+        compare the incremental trace with a full re-run of the current plan
+        """
+        se = SimEngine(
+            env=simpy.Environment(),
+            orderlist=self.data["orders"],
+            ticketlist=self.data["tickets"],
+            depotlist=self.data["depots"],
+            trucklist=self.data["trucks"],
+        )
+        se.run()
+        full = trace_to_frame(se.trace).sort_values("ticket_id", ignore_index=True)
+        trace = self.trace()
+        if (
+            len(full) != len(trace)
+            or not (full["ticket_id"] == trace["ticket_id"]).all()
+        ):
+            return False
+        return bool(
+            np.allclose(
+                full[SIM_COLUMNS].to_numpy(dtype=float),
+                trace[SIM_COLUMNS].to_numpy(dtype=float),
+                atol=atol,
+                equal_nan=True,
+            )
+        )
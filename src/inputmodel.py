@@ -0,0 +1,139 @@
+"""
+input modeling : fit distributions to historical stage durations
+every (group, stage) sample is fitted against the candidate scipy distributions
+in a process pool and the best fit (lowest aic) is kept; results are cached on
+disk by a fingerprint of the sample, so a refit only pays for groups whose data
+changed. groups with too few observations fall back to the pooled stage fit
+
+history is a frame with one row per ticket, e.g. the columns ship_loc, customer,
+a quantity class and load_mins / site_prep_mins / unload_mins / site_clean_mins
+"""
+
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from src.sampler import sample_stream
+
+STAGES = ["load_mins", "site_prep_mins", "unload_mins", "site_clean_mins"]
+CANDIDATES = ["gamma", "lognorm", "weibull_min", "norm", "expon", "triang", "uniform"]
+POOLED = "*"
+
+
+def fingerprint(values: np.ndarray, candidates: Sequence[str]) -> str:
+    values = np.sort(np.asarray(values, dtype=float))
+    digest = hashlib.sha1(values.tobytes())
+    digest.update(",".join(candidates).encode())
+    return digest.hexdigest()
+
+
+def quantity_class(quantity: pd.Series, bins=(0, 20, 40, 60, np.inf)) -> pd.Series:
+    return pd.cut(quantity, bins=list(bins), right=False).astype(str)
+
+
+def fit_candidate(values: np.ndarray, dist_name: str) -> dict:
+    """
+    maximum likelihood fit of one candidate with its aic and ks statistic
+    """
+    dist = getattr(stats, dist_name)
+    try:
+        with np.errstate(all="ignore"):
+            params = dist.fit(values)
+            loglik = dist.logpdf(values, *params).sum()
+    except (ValueError, RuntimeError, FloatingPointError):
+        return {"dist": dist_name, "params": None, "aic": np.inf, "ks": np.inf}
+    if not np.isfinite(loglik):
+        return {"dist": dist_name, "params": None, "aic": np.inf, "ks": np.inf}
+    return {
+        "dist": dist_name,
+        "params": [float(p) for p in params],
+        "aic": float(2 * len(params) - 2 * loglik),
+        "ks": float(stats.kstest(values, dist_name, args=params).statistic),
+    }
+
+
+def _fit_task(task):
+    key, values, dist_name = task
+    return key, fit_candidate(values, dist_name)
+
+
+class InputModels:
+    """
+    fitted distributions keyed by (group, stage); group is a tuple of the
+    grouping values, or POOLED for the fit over all observations of the stage
+    """
+
+    def __init__(self, fits: Dict[tuple, dict], by: List[str]):
+        self.fits = fits
+        self.by = by
+
+    def fit(self, stage: str, group=POOLED) -> dict:
+        if not isinstance(group, tuple) and group != POOLED:
+            group = (group,)
+        return self.fits.get((group, stage)) or self.fits[(POOLED, stage)]
+
+    def stream(self, stage: str, group=POOLED, seed=None, batch_size=1024):
+        """
+        endless iterator of durations drawn from the fitted distribution
+        """
+        fit = self.fit(stage, group)
+        return sample_stream(fit["dist"], fit["params"], seed, batch_size)
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = []
+        for (group, stage), fit in self.fits.items():
+            values = group if group != POOLED else (POOLED,) * len(self.by)
+            rows.append({**dict(zip(self.by, values)), "stage": stage, **fit})
+        return pd.DataFrame(rows)
+
+
+def fit_input_models(
+    history: pd.DataFrame,
+    by: List[str],
+    stages: List[str] = STAGES,
+    candidates: Sequence[str] = CANDIDATES,
+    min_samples: int = 30,
+    cache_path=None,
+    n_workers: int = None,
+) -> InputModels:
+    """
+    fit every stage per group of the by columns (and pooled) in parallel
+    cache_path is a json file of fingerprint -> best fit reused across calls
+    """
+    cache = {}
+    if cache_path is not None and Path(cache_path).exists():
+        cache = json.loads(Path(cache_path).read_text())
+
+    samples = {}
+    for stage in stages:
+        samples[(POOLED, stage)] = history[stage].dropna().to_numpy(dtype=float)
+        for group, frame in history.groupby(by, sort=False):
+            values = frame[stage].dropna().to_numpy(dtype=float)
+            if len(values) >= min_samples:
+                group = group if isinstance(group, tuple) else (group,)
+                samples[(group, stage)] = values
+
+    keys = {key: fingerprint(values, candidates) for key, values in samples.items()}
+    missing = {keys[key]: samples[key] for key in samples if keys[key] not in cache}
+    if missing:
+        tasks = [
+            (key, values, dist_name)
+            for key, values in missing.items()
+            for dist_name in candidates
+        ]
+        chunksize = max(1, len(tasks) // (4 * (n_workers or 8)))
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            for key, fit in pool.map(_fit_task, tasks, chunksize=chunksize):
+                if key not in cache or fit["aic"] < cache[key]["aic"]:
+                    cache[key] = {**fit, "n": len(missing[key])}
+        if cache_path is not None:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            Path(cache_path).write_text(json.dumps(cache))
+
+    return InputModels({key: cache[fp] for key, fp in keys.items()}, list(by))
@@ -0,0 +1,185 @@
+"""
+level watching containers and event triggered replenishment
+a WatchedContainer fires events when its level (or inventory position, level plus
+quantity on order) reaches a threshold, so replenishment policies wait on an
+event instead of polling the level on a timer; threshold checks only look at
+the thresholds between the old and the new value (bisect), which keeps many
+containers with many watchers cheap
+
+time weighted inventory statistics are accumulated on every level change
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+
+import simpy
+from simpy.resources.container import ContainerPut
+
+
+class Delivery(ContainerPut):
+    """
+    put of an ordered quantity : moves it from on_order to the level
+    """
+
+    delivery = True
+
+
+class _Watchers:
+    """
+    pending (threshold, seq, event) sorted by threshold, for one direction
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, threshold, seq, event):
+        insort(self.items, (threshold, seq, event))
+
+    def pop_between(self, low, high):
+        """
+        remove and return the events with low <= threshold <= high
+        """
+        lo = bisect_left(self.items, (low,))
+        hi = bisect_right(self.items, (high, float("inf")))
+        fired = self.items[lo:hi]
+        del self.items[lo:hi]
+        return [event for _, _, event in fired]
+
+
+class WatchedContainer(simpy.Container):
+    def __init__(self, env, capacity=float("inf"), init=0):
+        super().__init__(env, capacity, init)
+        self.on_order = 0
+        self._seq = count()
+        self._below = {"level": _Watchers(), "position": _Watchers()}
+        self._above = {"level": _Watchers(), "position": _Watchers()}
+        # time weighted statistics
+        self._last_time = env.now
+        self._start_time = env.now
+        self._area = 0.0
+        self._stockout_time = 0.0
+        self.min_level = init
+        self.max_level = init
+        self.n_orders = 0
+
+    @property
+    def position(self):
+        return self._level + self.on_order
+
+    def _value(self, kind):
+        return self._level if kind == "level" else self.position
+
+    def when_at_or_below(self, threshold, kind="level") -> simpy.Event:
+        """
+        event that succeeds (with the value) once the level or position is <= threshold
+        already triggered when the condition holds now
+        """
+        event = self._env.event()
+        value = self._value(kind)
+        if value <= threshold:
+            event.succeed(value)
+        else:
+            self._below[kind].add(threshold, next(self._seq), event)
+        return event
+
+    def when_at_or_above(self, threshold, kind="level") -> simpy.Event:
+        event = self._env.event()
+        value = self._value(kind)
+        if value >= threshold:
+            event.succeed(value)
+        else:
+            self._above[kind].add(threshold, next(self._seq), event)
+        return event
+
+    def _changed(self, kind, before, after):
+        if after < before:
+            fired = self._below[kind].pop_between(after, before)
+        elif after > before:
+            fired = self._above[kind].pop_between(before, after)
+        else:
+            return
+        for event in fired:
+            event.succeed(after)
+
+    def _record(self, before):
+        now = self._env.now
+        elapsed = now - self._last_time
+        self._area += before * elapsed
+        if before <= 0:
+            self._stockout_time += elapsed
+        self._last_time = now
+        self.min_level = min(self.min_level, self._level)
+        self.max_level = max(self.max_level, self._level)
+
+    def _do_put(self, event):
+        before, position = self._level, self.position
+        done = super()._do_put(event)
+        if done and getattr(event, "delivery", False):
+            self.on_order -= event.amount
+        if self._level != before:
+            self._record(before)
+            self._changed("level", before, self._level)
+            self._changed("position", position, self.position)
+        return done
+
+    def _do_get(self, event):
+        before, position = self._level, self.position
+        done = super()._do_get(event)
+        if self._level != before:
+            self._record(before)
+            self._changed("level", before, self._level)
+            self._changed("position", position, self.position)
+        return done
+
+    def order(self, quantity, lead_time=0):
+        """
+        place a replenishment order delivered after lead_time
+        """
+        position = self.position
+        self.on_order += quantity
+        self.n_orders += 1
+        self._changed("position", position, self.position)
+        return self._env.process(self._deliver(quantity, lead_time))
+
+    def _deliver(self, quantity, lead_time):
+        if lead_time:
+            yield self._env.timeout(lead_time)
+        yield Delivery(self, quantity)
+
+    def stats(self) -> dict:
+        """
+        time weighted mean level and fraction of time out of stock so far
+        """
+        now = self._env.now
+        elapsed = now - self._last_time
+        area = self._area + self._level * elapsed
+        stockout = self._stockout_time + (elapsed if self._level <= 0 else 0)
+        horizon = now - self._start_time
+        return {
+            "mean_level": area / horizon if horizon else self._level,
+            "stockout_fraction": stockout / horizon if horizon else 0.0,
+            "min_level": self.min_level,
+            "max_level": self.max_level,
+            "orders": self.n_orders,
+        }
+
+
+def s_S_policy(env, container: WatchedContainer, s, S, lead_time=0):
+    """
+    order up to S whenever the inventory position drops to s or below
+    """
+    while True:
+        yield container.when_at_or_below(s, kind="position")
+        if container.position <= s:
+            container.order(S - container.position, lead_time)
+
+
+def r_Q_policy(env, container: WatchedContainer, r, Q, lead_time=0):
+    """
+    order multiples of Q whenever the inventory position drops to r or below
+    (enough to bring it back above r)
+    """
+    while True:
+        yield container.when_at_or_below(r, kind="position")
+        if container.position <= r:
+            container.order(Q * ((r - container.position) // Q + 1), lead_time)
@@ -0,0 +1,328 @@
+"""
+load spacing optimizer for ticket start times
+generate_data staggers the loads of an order by its mean unload time; with random
+unload times that spacing either queues trucks at the site (spacing too short)
+or leaves the site crew waiting for the next truck (too long)
+
+every order gets its own spacing : all integer spacings of a range are scored at
+once by a vectorized single bay site model (lindley recurrence, see vectorqueue)
+over sampled unload times shared by the candidates (common random numbers), and
+the cheapest in expectation is kept. SimEngine is only run to verify the plan,
+replaying unload times drawn from the same model in both plans; the new ticket
+arrive / start times are written back only when verification confirms them
+"""
+
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from src.analysis import ticket_kpis, trace_to_frame
+from src.simobj import SimEngine
+from src.vectorqueue import fifo_start_times
+
+
+def gamma_unload_times(mean_unload, n_samples, cv=0.3, rng=None) -> np.ndarray:
+    """
+    (samples x loads) unload times with the given means and coefficient of variation
+    """
+    rng = np.random.default_rng(rng)
+    mean_unload = np.asarray(mean_unload, dtype=float)
+    shape = 1 / cv**2
+    return rng.gamma(shape, mean_unload / shape, size=(n_samples, len(mean_unload)))
+
+
+def site_queue(arrivals: np.ndarray, unload: np.ndarray):
+    """
+    single unloading bay at the site, loads served in arrival order
+    arrivals and unload are (..., loads); returns the truck waits per load and the
+    total time the site sits idle between its first arrival and last unload
+    """
+    shape = np.broadcast_shapes(arrivals.shape, unload.shape)
+    arrivals = np.broadcast_to(arrivals, shape).reshape(-1, shape[-1])
+    unload = np.broadcast_to(unload, shape).reshape(-1, shape[-1])
+    starts = fifo_start_times(arrivals, unload)
+    waits = starts - arrivals
+    idle = starts[:, -1] + unload[:, -1] - arrivals[:, 0] - unload.sum(axis=1)
+    return waits.reshape(shape), idle.reshape(shape[:-1])
+
+
+def spacing_costs(
+    spacings: np.ndarray, unload: np.ndarray, site_weight: float = 1.0
+) -> np.ndarray:
+    """
+    expected truck waiting plus site_weight times site idle minutes of an order
+    for every candidate spacing, unload is (samples x loads)
+    """
+    spacings = np.asarray(spacings, dtype=float)
+    offsets = spacings[:, None] * np.arange(unload.shape[1])  # candidates x loads
+    waits, idle = site_queue(offsets[:, None, :], unload[None, :, :])
+    return (waits.sum(axis=2) + site_weight * idle).mean(axis=1)
+
+
+def _order_loads(tickets: pd.DataFrame):
+    for order_id, loads in tickets.groupby("order_id", sort=False):
+        yield order_id, loads.sort_values("load_number")
+
+
+def _draw_unload(loads, n_samples, cv, sampler, rng) -> np.ndarray:
+    if sampler is None:
+        return gamma_unload_times(loads["unload_mins"], n_samples, cv, rng)
+    return np.asarray(sampler(loads, n_samples, rng), dtype=float)
+
+
+def optimize_spacing(
+    tickets: pd.DataFrame,
+    n_samples: int = 500,
+    spacing_range=(0.5, 2.0),
+    site_weight: float = 1.0,
+    cv: float = 0.3,
+    sampler: Callable[[pd.DataFrame, int, np.random.Generator], np.ndarray] = None,
+    seed=None,
+) -> pd.DataFrame:
+    """
+    best spacing (minutes between planned arrivals of consecutive loads) per order
+    sampler(loads, n_samples, rng) may replace the gamma unload times, e.g. with
+    draws from fitted input models; it returns a (samples x loads) array
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for order_id, loads in _order_loads(tickets):
+        mean_unload = loads["unload_mins"].to_numpy(dtype=float)
+        arrive = loads["ticket_arrive_time"].to_numpy(dtype=float)
+        current = float(np.diff(arrive).mean()) if len(loads) > 1 else 0.0
+        if len(loads) < 2:
+            rows.append(
+                {
+                    "order_id": order_id,
+                    "n_loads": len(loads),
+                    "current_spacing": current,
+                    "spacing": current,
+                    "current_cost": 0.0,
+                    "cost": 0.0,
+                }
+            )
+            continue
+        unload = _draw_unload(loads, n_samples, cv, sampler, rng)
+        low = max(1, int(np.floor(spacing_range[0] * mean_unload.mean())))
+        high = int(np.ceil(spacing_range[1] * mean_unload.mean()))
+        candidates = np.append(np.arange(low, high + 1), current)
+        costs = spacing_costs(candidates, unload, site_weight)
+        best = int(np.argmin(costs[:-1]))
+        rows.append(
+            {
+                "order_id": order_id,
+                "n_loads": len(loads),
+                "current_spacing": current,
+                "spacing": float(candidates[best]),
+                "current_cost": float(costs[-1]),
+                "cost": float(costs[best]),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def apply_spacing(tickets: pd.DataFrame, spacing: Dict[str, float]) -> pd.DataFrame:
+    """
+    ticket frame with the arrive times of every order re-spaced from its first load
+    and ticket_start_time moved back by loading, travel and site prep (as in datagen)
+    """
+    tickets = tickets.copy()
+    first = tickets.groupby("order_id")["load_number"].transform("min")
+    anchor = (
+        tickets["ticket_arrive_time"]
+        .where(tickets["load_number"] == first)
+        .groupby(tickets["order_id"])
+        .transform("max")
+    )
+    step = tickets["order_id"].map(spacing)
+    respaced = step.notna()
+    arrive = anchor + (tickets["load_number"] - first) * step
+    tickets.loc[respaced, "ticket_arrive_time"] = (
+        arrive[respaced].round().astype(tickets["ticket_arrive_time"].dtype)
+    )
+    tickets["ticket_start_time"] = (
+        tickets["ticket_arrive_time"]
+        - tickets["load_mins"]
+        - tickets["travel_to_mins"]
+        - tickets["site_prep_mins"]
+    )
+    return tickets.sort_values(by=["ticket_start_time", "order_id"])
+
+
+def simulated_site_metrics(
+    trace: pd.DataFrame, site_weight: float = 1.0, tickets: pd.DataFrame = None
+):
+    """
+    per order site waits, idle time and cost of a SimEngine trace, with the loads
+    of an order queueing for one unloading bay in the order they reached the site
+    given the planned tickets, every order of the plan gets a row and unfinished
+    counts its loads missing from the trace (their waits and idle time are not in
+    the cost, so plans are only comparable when they finish the same loads)
+    """
+    if trace.empty:
+        trace = pd.DataFrame(
+            columns=["order_id", "sim_ticket_arrive_time", "sim_unload_mins"]
+        )
+    rows = []
+    for order_id, loads in trace.groupby("order_id"):
+        loads = loads.sort_values("sim_ticket_arrive_time")
+        waits, site_idle = site_queue(
+            loads["sim_ticket_arrive_time"].to_numpy(dtype=float)[None, :],
+            loads["sim_unload_mins"].to_numpy(dtype=float)[None, :],
+        )
+        rows.append(
+            {
+                "order_id": order_id,
+                "site_wait": float(waits.sum()),
+                "site_idle": float(site_idle.sum()),
+            }
+        )
+    metrics = pd.DataFrame(rows, columns=["order_id", "site_wait", "site_idle"])
+    metrics["cost"] = metrics["site_wait"] + site_weight * metrics["site_idle"]
+    metrics = metrics.set_index("order_id")
+    if tickets is not None:
+        planned = tickets.groupby("order_id").size()
+        finished = trace.groupby("order_id").size()
+        metrics = metrics.reindex(planned.index, fill_value=0.0)
+        metrics["unfinished"] = planned - finished.reindex(planned.index, fill_value=0)
+    return metrics
+
+
+def sampled_unload_mins(
+    tickets: pd.DataFrame, cv: float = 0.3, sampler=None, rng=None
+) -> pd.Series:
+    """
+    one draw of unload times per ticket (index of tickets), as in optimize_spacing
+    """
+    rng = np.random.default_rng(rng)
+    draws = []
+    for _, loads in _order_loads(tickets):
+        unload = _draw_unload(loads, 1, cv, sampler, rng)[0]
+        draws.append(pd.Series(unload, index=loads.index))
+    return pd.concat(draws).reindex(tickets.index)
+
+
+def verify_plan(
+    data: Dict[str, pd.DataFrame],
+    tickets: pd.DataFrame,
+    n_reps: int = 10,
+    site_weight: float = 1.0,
+    cv: float = 0.3,
+    sampler=None,
+    seed=None,
+):
+    """
+    SimEngine runs of the current and the re-spaced tickets under the unload time
+    model of the optimizer : every replication draws the unload times once and
+    replays them in both plans (common random numbers)
+    returns the mean kpis and site metrics per plan (unfinished loads included),
+    and the mean site cost and unfinished loads per order and plan (columns
+    current, optimized, current_unfinished, optimized_unfinished)
+    """
+    rng = np.random.default_rng(seed)
+    plans = {"current": data["tickets"], "optimized": tickets}
+    kpis = {plan: [] for plan in plans}
+    costs = {plan: [] for plan in plans}
+    unfinished = {plan: [] for plan in plans}
+    for _ in range(n_reps):
+        unload = sampled_unload_mins(data["tickets"], cv, sampler, rng)
+        for plan, plan_tickets in plans.items():
+            plan_tickets = plan_tickets.copy()
+            plan_tickets["unload_mins"] = unload.reindex(plan_tickets.index)
+            se = SimEngine(
+                env=simpy.Environment(),
+                orderlist=data["orders"],
+                ticketlist=plan_tickets,
+                depotlist=data["depots"],
+                trucklist=data["trucks"],
+            )
+            se.run()
+            trace = trace_to_frame(se.trace)
+            site = simulated_site_metrics(trace, site_weight, plan_tickets)
+            kpis[plan].append(
+                {
+                    **ticket_kpis(trace, n_tickets=len(plan_tickets)),
+                    **site.sum().to_dict(),
+                }
+            )
+            costs[plan].append(site["cost"])
+            unfinished[plan].append(site["unfinished"])
+    summary = pd.DataFrame(
+        {plan: pd.DataFrame(rows).mean() for plan, rows in kpis.items()}
+    ).T
+    by_order = pd.DataFrame(
+        {
+            **{
+                plan: pd.concat(frames, axis=1).mean(axis=1)
+                for plan, frames in costs.items()
+            },
+            **{
+                f"{plan}_unfinished": pd.concat(frames, axis=1).mean(axis=1)
+                for plan, frames in unfinished.items()
+            },
+        }
+    )
+    return summary, by_order
+
+
+def worse_orders(by_order: pd.DataFrame) -> pd.Index:
+    """
+    orders of verify_plan whose optimized spacing costs more or leaves more loads
+    unfinished; an order missing from a plan is as bad as it gets there
+    """
+    by_order = by_order.fillna(np.inf)
+    worse = (by_order["optimized"] > by_order["current"] + 1e-9) | (
+        by_order["optimized_unfinished"] > by_order["current_unfinished"]
+    )
+    return by_order.index[worse]
+
+
+def plan_accepted(summary: pd.DataFrame) -> bool:
+    """
+    the optimized plan of verify_plan finishes as many loads at no higher cost
+    """
+    optimized, current = summary.loc["optimized"], summary.loc["current"]
+    return bool(
+        optimized["unfinished"] <= current["unfinished"]
+        and optimized["cost"] <= current["cost"]
+    )
+
+
+def optimize_load_spacing(
+    data: Dict[str, pd.DataFrame],
+    n_reps: int = 10,
+    site_weight: float = 1.0,
+    cv: float = 0.3,
+    sampler=None,
+    seed=None,
+    **kwargs,
+):
+    """
+    optimize the spacing of every order and verify the plan with SimEngine under
+    the same unload time model; orders whose verified site cost got worse, or that
+    leave more loads unfinished, keep their current spacing, and the new ticket
+    times are only written back into data["tickets"] when the verified plan
+    leaves no more loads unfinished and its total cost does not exceed the
+    current one
+    returns the per order spacings (accepted flags the ones written back) and the
+    verification summary of the final plan
+    """
+    model = {"site_weight": site_weight, "cv": cv, "sampler": sampler}
+    spacings = optimize_spacing(data["tickets"], seed=seed, **model, **kwargs)
+    spacing = dict(zip(spacings["order_id"], spacings["spacing"]))
+    tickets = apply_spacing(data["tickets"], spacing)
+    summary, by_order = verify_plan(data, tickets, n_reps, seed=seed, **model)
+
+    worse = worse_orders(by_order)
+    if len(worse):
+        spacing = {k: v for k, v in spacing.items() if k not in set(worse)}
+        tickets = apply_spacing(data["tickets"], spacing)
+        summary, _ = verify_plan(data, tickets, n_reps, seed=seed, **model)
+
+    accepted = plan_accepted(summary)
+    spacings["accepted"] = accepted & spacings["order_id"].isin(list(spacing))
+    if accepted:
+        data["tickets"] = tickets
+    return spacings, summary
@@ -0,0 +1,180 @@
+"""
+simulation metamodels for fast what-if answers
+a latin hypercube design is run through the parallel replication machinery and
+a gaussian process surrogate is fitted on the replication means
+queries outside the design box or with too much uncertainty fall back to simulation
+"""
+
+from functools import partial
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy.stats import qmc
+
+from src.replication import run_tasks
+
+
+def latin_hypercube(space: Dict[str, Tuple], n_points: int, seed=None):
+    """
+    space maps a factor to (low, high) or (low, high, "int")
+    returns a list of parameter dicts
+    """
+    names = list(space)
+    unit = qmc.LatinHypercube(d=len(names), seed=seed).random(n_points)
+    low = np.array([space[n][0] for n in names], dtype=float)
+    high = np.array([space[n][1] for n in names], dtype=float)
+    points = qmc.scale(unit, low, high)
+    design = []
+    for row in points:
+        params = {}
+        for name, value in zip(names, row):
+            is_int = len(space[name]) > 2 and space[name][2] == "int"
+            params[name] = int(round(value)) if is_int else float(value)
+        design.append(params)
+    return design
+
+
+class GaussianProcess:
+    """
+    zero mean gaussian process with an anisotropic squared exponential kernel
+    inputs are scaled to the unit box and outputs standardized before fitting
+    hyperparameters maximize the log marginal likelihood
+    """
+
+    def __init__(self, low, high):
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+
+    def _scale(self, x):
+        return (np.atleast_2d(x) - self.low) / (self.high - self.low)
+
+    @staticmethod
+    def _kernel(a, b, lengthscales, signal):
+        d = (a[:, None, :] - b[None, :, :]) / lengthscales
+        return signal * np.exp(-0.5 * (d**2).sum(axis=-1))
+
+    def _neg_log_likelihood(self, theta, x, y):
+        lengthscales, signal, noise = (
+            np.exp(theta[:-2]),
+            np.exp(theta[-2]),
+            np.exp(theta[-1]),
+        )
+        k = self._kernel(x, x, lengthscales, signal) + (noise + 1e-8) * np.eye(len(x))
+        try:
+            factor = cho_factor(k, lower=True)
+        except np.linalg.LinAlgError:
+            return np.inf
+        alpha = cho_solve(factor, y)
+        return 0.5 * y @ alpha + np.log(np.diag(factor[0])).sum()
+
+    def fit(self, x, y):
+        x = self._scale(x)
+        y = np.asarray(y, dtype=float)
+        self.y_mean, self.y_std = y.mean(), y.std() or 1.0
+        y = (y - self.y_mean) / self.y_std
+        theta0 = np.concatenate([np.log(np.full(x.shape[1], 0.5)), [0.0, -3.0]])
+        bounds = [(-4, 3)] * x.shape[1] + [(-4, 4), (-10, 1)]
+        theta = minimize(self._neg_log_likelihood, theta0, args=(x, y), bounds=bounds).x
+        self.lengthscales = np.exp(theta[:-2])
+        self.signal, self.noise = np.exp(theta[-2]), np.exp(theta[-1])
+        k = self._kernel(x, x, self.lengthscales, self.signal)
+        self.factor = cho_factor(k + (self.noise + 1e-8) * np.eye(len(x)), lower=True)
+        self.alpha = cho_solve(self.factor, y)
+        self.x = x
+        return self
+
+    def predict(self, x):
+        """
+        posterior mean and standard deviation (of the mean response)
+        """
+        x = self._scale(x)
+        k = self._kernel(x, self.x, self.lengthscales, self.signal)
+        mean = k @ self.alpha
+        v = cho_solve(self.factor, k.T)
+        var = np.clip(self.signal - (k * v.T).sum(axis=1), 0, None)
+        return mean * self.y_std + self.y_mean, np.sqrt(var) * self.y_std
+
+
+class Metamodel:
+    """
+    model(seed, **params) -> kpi is any picklable simulation replication
+    space defines the validity box (see latin_hypercube)
+    max_std is the largest predictive std accepted before falling back to simulation
+    """
+
+    def __init__(
+        self,
+        model: Callable[..., float],
+        space: Dict[str, Tuple],
+        max_std: float = np.inf,
+        fallback_replications: int = 10,
+    ):
+        self.model = model
+        self.space = space
+        self.names = list(space)
+        self.low = np.array([space[n][0] for n in self.names], dtype=float)
+        self.high = np.array([space[n][1] for n in self.names], dtype=float)
+        self.max_std = max_std
+        self.fallback_replications = fallback_replications
+        self.gp = None
+
+    def _vector(self, params):
+        return np.array([params[n] for n in self.names], dtype=float)
+
+    def simulate(self, params, replications, first_seed=0, executor=None):
+        tasks = [
+            (partial(self.model, **params), seed)
+            for seed in range(first_seed, first_seed + replications)
+        ]
+        return run_tasks(tasks, executor=executor)
+
+    def fit(
+        self, n_points=40, replications=5, seed=None, n_workers=None, executor=None
+    ):
+        """
+        run the space filling design (all points x replications in one parallel map)
+        and fit the surrogate on the replication means
+        """
+        self.design = latin_hypercube(self.space, n_points, seed=seed)
+        tasks = [
+            (partial(self.model, **params), s)
+            for params in self.design
+            for s in range(replications)
+        ]
+        results = np.array(
+            run_tasks(tasks, executor=executor, n_workers=n_workers), dtype=float
+        ).reshape(n_points, replications)
+        self.responses = results
+        x = np.array([self._vector(p) for p in self.design])
+        self.gp = GaussianProcess(self.low, self.high).fit(x, results.mean(axis=1))
+        return self
+
+    def in_domain(self, params) -> bool:
+        x = self._vector(params)
+        return bool(np.all(x >= self.low) and np.all(x <= self.high))
+
+    def predict(self, params) -> dict:
+        mean, std = self.gp.predict(self._vector(params))
+        return {"mean": float(mean[0]), "std": float(std[0]), "source": "surrogate"}
+
+    def query(self, params, fallback=True, executor=None) -> dict:
+        """
+        surrogate answer with uncertainty, or a fresh simulation estimate when the
+        point is outside the design box or the surrogate is too uncertain
+        """
+        if self.in_domain(params):
+            prediction = self.predict(params)
+            if prediction["std"] <= self.max_std or not fallback:
+                return prediction
+        elif not fallback:
+            raise ValueError(f"{params} is outside the metamodel domain")
+        values = np.array(
+            self.simulate(params, self.fallback_replications, executor=executor)
+        )
+        return {
+            "mean": float(values.mean()),
+            "std": float(values.std(ddof=1) / np.sqrt(len(values))),
+            "source": "simulation",
+        }
@@ -0,0 +1,204 @@
+"""
+live kpi publishing over shared memory
+the publisher rewrites a fixed layout float64 block every interval of simulated
+time; readers attach by name and poll it without locks (seqlock : the sequence
+number is odd while a write is in progress)
+
+layout (float64 slots):
+    0 seq | 1 sim time | 2 wall time | 3 n_depots | 4 trucks total
+    5 trucks busy | 6 truck utilization | 7 completed tickets | 8 late tickets
+    9 events/sec | then per depot : queue size, idle trucks, loaders busy
+followed by NAME_BYTES of utf-8 per depot id
+"""
+
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import simpy
+
+from src.simobj import SimEngine
+
+HEADER = [
+    "seq",
+    "now",
+    "wall_time",
+    "n_depots",
+    "trucks_total",
+    "trucks_busy",
+    "utilization",
+    "completed_tickets",
+    "late_tickets",
+    "events_per_sec",
+]
+DEPOT_FIELDS = ["queue_size", "idle_trucks", "loaders_busy"]
+NAME_BYTES = 32
+
+# blocks created by publishers of this process
+_published = set()
+
+
+def block_size(n_depots: int) -> int:
+    return 8 * (len(HEADER) + len(DEPOT_FIELDS) * n_depots) + NAME_BYTES * n_depots
+
+
+class CountingEnvironment(simpy.Environment):
+    """
+    simpy environment that counts processed events (for events/sec)
+    """
+
+    def __init__(self, initial_time=0):
+        super().__init__(initial_time)
+        self.events_processed = 0
+
+    def step(self):
+        super().step()
+        self.events_processed += 1
+
+
+def _horizon(env: simpy.Environment) -> float:
+    """
+    time of the latest scheduled event; the clock reaches it whatever happens
+    """
+    return max(entry[0] for entry in env._queue)
+
+
+class MetricsPublisher:
+    """
+    writes engine kpis into a named shared memory block
+    writing never waits on readers; slow readers just see a later snapshot
+    """
+
+    def __init__(self, engine: SimEngine, name: str = None, interval: float = 5):
+        self.engine = engine
+        self.interval = interval
+        n_depots = len(engine.depots)
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=block_size(n_depots)
+        )
+        n_values = len(HEADER) + len(DEPOT_FIELDS) * n_depots
+        self.values = np.ndarray((n_values,), dtype=np.float64, buffer=self.shm.buf)
+        self.values[:] = 0
+        self.values[3] = n_depots
+        _published.add(self.shm.name)
+        names = self.shm.buf[8 * n_values :]
+        for k, depot in enumerate(engine.depots):
+            encoded = depot.depot_id.encode()[:NAME_BYTES].ljust(NAME_BYTES, b"\0")
+            names[k * NAME_BYTES : (k + 1) * NAME_BYTES] = encoded
+        self._last_wall = time.monotonic()
+        self._last_events = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self) -> None:
+        engine = self.engine
+        values = self.values
+        wall = time.monotonic()
+        events = getattr(engine.env, "events_processed", np.nan)
+        elapsed = wall - self._last_wall
+        events_per_sec = (events - self._last_events) / elapsed if elapsed else np.nan
+        self._last_wall, self._last_events = wall, events
+
+        trucks_busy = sum(truck.resource.count for truck in engine.trucks)
+        trucks_total = len(engine.trucks)
+
+        values[0] += 1  # odd : write in progress
+        values[1] = engine.env.now
+        values[2] = time.time()
+        values[4] = trucks_total
+        values[5] = trucks_busy
+        values[6] = trucks_busy / trucks_total if trucks_total else 0
+        values[7] = engine.completed_tickets
+        values[8] = engine.late_tickets
+        values[9] = events_per_sec
+        offset = len(HEADER)
+        for depot in engine.depots:
+            values[offset] = depot.queue_size
+            values[offset + 1] = len(depot.yard.items)
+            values[offset + 2] = depot.loading_bay.count
+            offset += len(DEPOT_FIELDS)
+        values[0] += 1  # even : consistent
+
+    def process(self, until: float = None):
+        """
+        simpy process publishing every interval of simulated time
+        stops (after a last write) at simulated time until, or once no other event
+        is scheduled, so env.run() without until still returns when the engine is
+        done; pass until when work is injected from outside (e.g. RealtimeTwin)
+        without until the clock is never pushed past the model's last event : a
+        tick due after every scheduled event waits for the latest of them first
+        """
+        env = self.engine.env
+        if until is not None:
+            while True:
+                self.write()
+                if env.now >= until:
+                    return
+                yield env.timeout(min(self.interval, until - env.now))
+
+        next_write = env.now
+        while True:
+            written = env.now >= next_write
+            if written:
+                self.write()
+                next_write = env.now + self.interval
+            if env.peek() == float("inf"):
+                if not written:
+                    self.write()
+                return
+            yield env.timeout(min(next_write, _horizon(env)) - env.now)
+
+    def start(self, until: float = None):
+        return self.engine.env.process(self.process(until))
+
+    def close(self, unlink=True) -> None:
+        del self.values
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _published.discard(self.shm.name)
+
+
+class MetricsReader:
+    """
+    attaches to a publisher's block by name
+    view is a zero-copy array over the block; read() returns a consistent snapshot
+    """
+
+    def __init__(self, name: str):
+        self.shm = shared_memory.SharedMemory(name=name)
+        if name not in _published:
+            # the publisher owns the block : do not let this process unlink it at exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        n_depots = int(np.ndarray((4,), dtype=np.float64, buffer=self.shm.buf)[3])
+        n_values = len(HEADER) + len(DEPOT_FIELDS) * n_depots
+        self.view = np.ndarray((n_values,), dtype=np.float64, buffer=self.shm.buf)
+        names = bytes(self.shm.buf[8 * n_values : 8 * n_values + NAME_BYTES * n_depots])
+        self.depot_ids = [
+            names[k * NAME_BYTES : (k + 1) * NAME_BYTES].rstrip(b"\0").decode()
+            for k in range(n_depots)
+        ]
+
+    def read(self, retries=100) -> dict:
+        for _ in range(retries):
+            seq = self.view[0]
+            if seq % 2:
+                continue
+            values = self.view.copy()
+            if self.view[0] == seq:
+                break
+        else:
+            raise TimeoutError("publisher kept writing, no consistent snapshot")
+        snapshot = dict(zip(HEADER, values[: len(HEADER)].tolist()))
+        depot_values = values[len(HEADER) :].reshape(-1, len(DEPOT_FIELDS))
+        snapshot["depots"] = {
+            depot_id: dict(zip(DEPOT_FIELDS, row.tolist()))
+            for depot_id, row in zip(self.depot_ids, depot_values)
+        }
+        return snapshot
+
+    def close(self) -> None:
+        del self.view
+        self.shm.close()
@@ -0,0 +1,159 @@
+"""
+declarative ticket stage pipelines
+a pipeline is a sequence of Stage definitions (name, duration source, resource,
+hooks) compiled once into a tuple of steps with integer stage codes; running a
+ticket is then a tight loop over the steps without per event string building
+
+stage timings go into preallocated float arrays of shape (n_tickets, n_codes, 2)
+holding (entered, ended) per stage code
+"""
+
+import logging
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Callable, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    duration is a ticket attribute name or a callable (ticket, ctx) -> minutes
+    (None for a stage that only waits for its resource)
+    acquire is a callable (ticket, ctx) -> simpy resource requested on entry and
+    held until the end of the stage, or of the first later stage with release=True
+    hooks :
+        on_enter(ticket, ctx)              before queueing for the resource
+        on_start(ticket, ctx, now)         once the resource is held
+        on_end(ticket, ctx, entered, now)  when the stage is over
+    """
+
+    name: str
+    duration: Union[str, Callable, None] = None
+    acquire: Callable = None
+    release: bool = None
+    on_enter: Callable = None
+    on_start: Callable = None
+    on_end: Callable = None
+
+
+def _duration_source(duration):
+    if duration is None or callable(duration):
+        return duration
+    getter = attrgetter(duration)
+    return lambda ticket, ctx: getter(ticket)
+
+
+class Pipeline:
+    """
+    compiled stage sequence
+    logger, when given and enabled for DEBUG, traces stage entries using the
+    ticket attribute id_attr (checked once per ticket, formatted lazily)
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        logger: logging.Logger = None,
+        id_attr: str = "ticket_id",
+    ):
+        self.stages = tuple(stages)
+        self.names = tuple(stage.name for stage in self.stages)
+        self.labels = tuple(f"{k + 1}_{name}" for k, name in enumerate(self.names))
+        self.codes = {name: code for code, name in enumerate(self.names)}
+        self.n_codes = len(self.stages)
+        self.logger = logger
+        self._ticket_id = attrgetter(id_attr)
+        self._steps = tuple(
+            (
+                code,
+                stage.name,
+                _duration_source(stage.duration),
+                stage.acquire,
+                # a stage acquiring a resource releases it itself unless told otherwise
+                stage.release
+                if stage.release is not None
+                else stage.acquire is not None,
+                stage.on_enter,
+                stage.on_start,
+                stage.on_end,
+            )
+            for code, stage in enumerate(self.stages)
+        )
+
+    def new_records(self, n_tickets: int) -> np.ndarray:
+        return np.full((n_tickets, self.n_codes, 2), np.nan)
+
+    def run(self, env, ticket, ctx=None, records: np.ndarray = None):
+        """
+        simpy process walking ticket through the stages
+        records is the (n_codes, 2) row of this ticket, or None to skip timings
+        """
+        timeout = env.timeout
+        debug = self.logger is not None and self.logger.isEnabledFor(logging.DEBUG)
+        held = []
+        try:
+            for (
+                code,
+                name,
+                duration,
+                acquire,
+                release,
+                on_enter,
+                on_start,
+                on_end,
+            ) in self._steps:
+                entered = env.now
+                if debug:
+                    self.logger.debug(
+                        "%s: %s: %.2f", self._ticket_id(ticket), name, entered
+                    )
+                if on_enter is not None:
+                    on_enter(ticket, ctx)
+                if acquire is not None:
+                    request = acquire(ticket, ctx).request()
+                    held.append(request)
+                    yield request
+                if on_start is not None:
+                    on_start(ticket, ctx, env.now)
+                if duration is not None:
+                    yield timeout(duration(ticket, ctx))
+                if release:
+                    request = held.pop()
+                    request.resource.release(request)
+                if records is not None:
+                    records[code, 0] = entered
+                    records[code, 1] = env.now
+                if on_end is not None:
+                    on_end(ticket, ctx, entered, env.now)
+        except GeneratorExit:
+            # generator cleanup : only withdraw queued requests (as simpy's with block)
+            for request in held:
+                request.cancel()
+            held.clear()
+            raise
+        finally:
+            # interrupted or ended while holding : give the resources back
+            for request in reversed(held):
+                request.cancel()
+                request.resource.release(request)
+
+    def to_frame(self, records: np.ndarray, ticket_ids=None) -> pd.DataFrame:
+        """
+        long (ticket, stage, start, end) frame of the recorded timings
+        """
+        n_tickets = len(records)
+        ticket_ids = (
+            np.arange(n_tickets) if ticket_ids is None else np.asarray(ticket_ids)
+        )
+        frame = pd.DataFrame(
+            {
+                "ticket": np.repeat(ticket_ids, self.n_codes),
+                "stage": np.tile(np.array(self.labels), n_tickets),
+                "start": records[:, :, 0].ravel(),
+                "end": records[:, :, 1].ravel(),
+            }
+        )
+        return frame.dropna(subset=["start"]).reset_index(drop=True)
@@ -0,0 +1,218 @@
+"""
+analytical queueing screen for depot loaders and site unloading bays
+arrival rates and service time moments are estimated per station and time of day
+bucket from the ticket frame, and the mean queue wait of every candidate capacity
+is approximated with erlang-c (m/m/c), kingman (g/g/1) or allen-cunneen (g/g/c)
+
+candidates clearly above or below the wait target are decided analytically;
+only the borderline ones are passed on to a SimEngine run
+"""
+
+import random
+from typing import Callable, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from src.analysis import trace_to_frame
+from src.simobj import SimEngine
+
+
+def erlang_c(c: int, load: float) -> float:
+    """
+    probability of waiting in an m/m/c queue with offered load lambda / mu
+    """
+    if load >= c:
+        return 1.0
+    # erlang-b by recursion, then convert to erlang-c
+    b = 1.0
+    for k in range(1, c + 1):
+        b = load * b / (k + load * b)
+    rho = load / c
+    return b / (1 - rho + rho * b)
+
+
+def mmc_wait(arrival_rate: float, mean_service: float, c: int) -> float:
+    load = arrival_rate * mean_service
+    if load >= c:
+        return np.inf
+    return erlang_c(c, load) * mean_service / (c - load)
+
+
+def kingman_wait(arrival_rate, mean_service, ca2=1.0, cs2=1.0) -> float:
+    """
+    g/g/1 mean queue wait (heavy traffic approximation)
+    """
+    rho = arrival_rate * mean_service
+    if rho >= 1:
+        return np.inf
+    return rho / (1 - rho) * (ca2 + cs2) / 2 * mean_service
+
+
+def allen_cunneen_wait(arrival_rate, mean_service, c, ca2=1.0, cs2=1.0) -> float:
+    """
+    g/g/c mean queue wait : m/m/c wait scaled by the variability term
+    """
+    if c == 1:
+        return kingman_wait(arrival_rate, mean_service, ca2, cs2)
+    return mmc_wait(arrival_rate, mean_service, c) * (ca2 + cs2) / 2
+
+
+def station_profile(
+    tickets: pd.DataFrame,
+    station: str,
+    time_col: str,
+    service_col: str,
+    bucket: int = 60,
+) -> pd.DataFrame:
+    """
+    per station and time of day bucket : arrivals, arrival rate (per minute),
+    squared coefficient of variation of interarrival times (ca2), mean service
+    time and its squared coefficient of variation (cs2)
+    """
+    frame = tickets[[station, time_col, service_col]].sort_values(time_col)
+    frame["gap"] = frame.groupby(station)[time_col].diff()
+    frame["bucket"] = (frame[time_col] // bucket * bucket).astype(int)
+    grouped = frame.groupby([station, "bucket"])
+    profile = grouped.agg(
+        arrivals=(time_col, "size"),
+        gap_mean=("gap", "mean"),
+        gap_var=("gap", "var"),
+        mean_service=(service_col, "mean"),
+        service_var=(service_col, "var"),
+    ).reset_index()
+    profile["arrival_rate"] = profile["arrivals"] / bucket
+    ca2 = profile["gap_var"] / profile["gap_mean"] ** 2
+    profile["ca2"] = ca2.where(profile["arrivals"] > 2, 1.0).fillna(1.0)
+    cs2 = profile["service_var"] / profile["mean_service"] ** 2
+    profile["cs2"] = cs2.fillna(0.0)
+    return profile.drop(columns=["gap_mean", "gap_var", "service_var"])
+
+
+def loader_profile(tickets: pd.DataFrame, bucket: int = 60) -> pd.DataFrame:
+    return station_profile(
+        tickets, "ship_loc", "ticket_start_time", "load_mins", bucket
+    )
+
+
+def unloading_profile(tickets: pd.DataFrame, bucket: int = 60) -> pd.DataFrame:
+    return station_profile(
+        tickets, "order_id", "ticket_arrive_time", "unload_mins", bucket
+    )
+
+
+def screen_capacities(
+    profile: pd.DataFrame,
+    capacities: Iterable[int],
+    max_wait: float,
+    slack: float = 2.0,
+    max_utilization: float = 1.0,
+) -> pd.DataFrame:
+    """
+    classify every (station, capacity) for a mean queue wait target of max_wait
+    minutes in the busiest bucket :
+        infeasible       utilization >= max_utilization or wait > slack * max_wait
+        over-provisioned one server less already waits < max_wait / slack
+        feasible         wait < max_wait / slack
+        borderline       anything else (to be simulated)
+    """
+    station = profile.columns[0]
+    capacities = sorted(set(capacities))
+    rows = []
+    for station_id, buckets in profile.groupby(station, sort=False):
+        waits = {}
+        # every capacity and the one below it, listed or not
+        for c in sorted(set(capacities) | {c - 1 for c in capacities}):
+            if c < 1:
+                waits[c] = None
+                continue
+            bucket_waits = [
+                allen_cunneen_wait(b.arrival_rate, b.mean_service, c, b.ca2, b.cs2)
+                for b in buckets.itertuples()
+            ]
+            utilization = (buckets["arrival_rate"] * buckets["mean_service"]).max() / c
+            waits[c] = (max(bucket_waits), utilization)
+        for c in capacities:
+            wait, utilization = waits[c]
+            below = waits[c - 1]
+            if utilization >= max_utilization or wait > slack * max_wait:
+                verdict = "infeasible"
+            elif below is not None and below[0] < max_wait / slack:
+                verdict = "over-provisioned"
+            elif wait < max_wait / slack:
+                verdict = "feasible"
+            else:
+                verdict = "borderline"
+            rows.append(
+                {
+                    station: station_id,
+                    "capacity": c,
+                    "utilization": utilization,
+                    "est_wait": wait,
+                    "verdict": verdict,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def simulated_loader_waits(
+    data: Dict[str, pd.DataFrame], loader_capacity: Dict[str, int], seed=None
+) -> pd.Series:
+    """
+    mean loading bay wait per depot (truck assigned -> start loading, the wait for
+    a truck in the yard excluded) from one SimEngine run with the given loader
+    capacities
+    """
+    if seed is not None:
+        random.seed(seed)
+    depots = data["depots"].copy()
+    depots["loader_capacity"] = (
+        depots["depot_id"].map(loader_capacity).fillna(1).astype(int)
+    )
+    se = SimEngine(
+        env=simpy.Environment(),
+        orderlist=data["orders"],
+        ticketlist=data["tickets"],
+        depotlist=depots,
+        trucklist=data["trucks"],
+    )
+    se.run()
+    trace = trace_to_frame(se.trace)
+    return trace["sim_loader_wait_mins"].groupby(trace["ship_loc"]).mean()
+
+
+def loader_capacity_study(
+    data: Dict[str, pd.DataFrame],
+    capacities: Iterable[int],
+    max_wait: float,
+    slack: float = 2.0,
+    bucket: int = 60,
+    simulate: Callable[[Dict[str, pd.DataFrame], Dict[str, int]], pd.Series] = None,
+) -> pd.DataFrame:
+    """
+    screen loader capacities analytically, then simulate the borderline ones
+    (each simulated capacity level is one run with every borderline depot set to it)
+    """
+    simulate = simulate or simulated_loader_waits
+    screen = screen_capacities(
+        loader_profile(data["tickets"], bucket), capacities, max_wait, slack
+    )
+    screen["sim_wait"] = np.nan
+    borderline = screen[screen["verdict"] == "borderline"]
+    for c, rows in borderline.groupby("capacity"):
+        waits = simulate(data, dict.fromkeys(rows["ship_loc"], int(c)))
+        screen.loc[rows.index, "sim_wait"] = rows["ship_loc"].map(waits).to_numpy()
+    simulated = screen["sim_wait"].notna()
+    screen.loc[simulated, "verdict"] = np.where(
+        screen.loc[simulated, "sim_wait"] <= max_wait, "feasible", "infeasible"
+    )
+    # a capacity is more than needed once the level below it (c - 1, when it was
+    # studied too; screen_capacities already judged it analytically) meets the target
+    verdicts = screen.set_index(["ship_loc", "capacity"])["verdict"]
+    below = verdicts.reindex(
+        pd.MultiIndex.from_arrays([screen["ship_loc"], screen["capacity"] - 1])
+    )
+    met = below.isin(["feasible", "over-provisioned"]).to_numpy()
+    screen.loc[met, "verdict"] = "over-provisioned"
+    return screen
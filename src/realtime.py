@@ -0,0 +1,148 @@
+"""
+real-time digital twin mode
+the SimEngine environment advances in step with the wall clock (scaled by factor)
+while ticket and truck updates arrive through a bounded asyncio queue
+
+events are dicts with a "type" key :
+    order_created     : {"order": {... orderlist row ...}}
+    ticket_created    : {"ticket": {... ticketlist row ...}}
+    ticket_cancelled  : {"ticket_id": ...}
+    truck_available   : {"truck_id": ..., "depot_id": ... (optional)}
+    truck_unavailable : {"truck_id": ...}
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+
+from src.simobj import SimEngine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RealtimeTwin:
+    """
+    factor is the number of simulated minutes per wall clock second
+    (1 / 60 is real time, 60 runs one simulated hour per minute)
+    queue_size bounds the event queue; producers block when it is full
+    max_batch caps the events applied per tick so queries stay responsive
+    """
+
+    engine: SimEngine
+    factor: float = 1 / 60
+    tick: float = 0.05
+    queue_size: int = 10_000
+    max_batch: int = 1_000
+    applied: int = 0
+    rejected: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.events = asyncio.Queue(maxsize=self.queue_size)
+        self._running = False
+
+    async def put(self, event: dict) -> None:
+        await self.events.put(event)
+
+    def apply(self, event: dict) -> None:
+        engine = self.engine
+        kind = event["type"]
+        if kind == "order_created":
+            engine.add_order(engine._order_from_row(event["order"], []))
+        elif kind == "ticket_created":
+            engine.schedule_ticket(engine._ticket_from_row(event["ticket"]))
+        elif kind == "ticket_cancelled":
+            if not engine.cancel_ticket(event["ticket_id"]):
+                self.rejected.append(event)
+        elif kind == "truck_available":
+            engine.set_truck_available(event["truck_id"], event.get("depot_id"))
+        elif kind == "truck_unavailable":
+            engine.set_truck_unavailable(event["truck_id"])
+        else:
+            raise ValueError(f"unknown event type {kind}")
+        self.applied += 1
+
+    def _drain(self) -> None:
+        for _ in range(self.max_batch):
+            try:
+                event = self.events.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                self.apply(event)
+            except (LookupError, ValueError) as exc:
+                logger.warning(f"rejected event {event}: {exc!r}")
+                self.rejected.append(event)
+            finally:
+                self.events.task_done()
+
+    async def run(self, until: float = None) -> None:
+        """
+        advance the simulation with the wall clock until simulated minute until
+        (or until stop() is called)
+        """
+        env = self.engine.env
+        self.engine.start()
+        self._running = True
+        wall_start = time.monotonic()
+        sim_start = env.now
+        while self._running:
+            self._drain()
+            target = sim_start + (time.monotonic() - wall_start) * self.factor
+            if until is not None:
+                target = min(target, until)
+            if target > env.now:
+                env.run(until=target)
+            if until is not None and env.now >= until:
+                break
+            await asyncio.sleep(self.tick)
+        self._drain()
+        self._running = False
+
+    def stop(self) -> None:
+        self._running = False
+
+    def snapshot(self) -> dict:
+        engine = self.engine
+        return {
+            "now": engine.env.now,
+            "queue_sizes": {d.depot_id: d.queue_size for d in engine.depots},
+            "idle_trucks": {d.depot_id: len(d.yard.items) for d in engine.depots},
+            "busy_trucks": sum(t.resource.count for t in engine.trucks),
+            "completed_tickets": engine.completed_tickets,
+            "pending_events": self.events.qsize(),
+            "applied_events": self.applied,
+        }
+
+
+async def file_source(path, twin: RealtimeTwin, poll=0.1, follow=True) -> None:
+    """
+    feed json lines from a file into the twin, tailing it for new lines
+    """
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if line:
+                if line.strip():
+                    await twin.put(json.loads(line))
+            elif follow:
+                await asyncio.sleep(poll)
+            else:
+                return
+
+
+async def socket_source(twin: RealtimeTwin, host="127.0.0.1", port=8765):
+    """
+    accept json line events over a local tcp socket
+    a full queue stops reading, which pushes back on the sender through tcp
+    """
+
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            if line.strip():
+                await twin.put(json.loads(line))
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,110 @@
+"""
+parallel replications of a simulation model
+a model is any picklable callable taking a seed (functools.partial for settings)
+"""
+
+import math
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+from src.analysis import t_interval
+
+
+def run_replications(
+    model: Callable[[int], Any],
+    seeds: Iterable[int],
+    n_workers: int = None,
+    executor: Executor = None,
+) -> List[Any]:
+    """
+    run model(seed) for every seed and return the results in seed order
+    an existing executor can be passed in to reuse worker processes across calls
+    """
+    seeds = list(seeds)
+    if executor is not None:
+        return list(executor.map(model, seeds))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(model, seeds))
+
+
+def _call(task):
+    model, seed = task
+    return model(seed)
+
+
+def run_tasks(tasks, executor: Executor = None, n_workers: int = None) -> List[Any]:
+    """
+    run a list of (model, seed) pairs, possibly mixing different models
+    """
+    tasks = list(tasks)
+    if executor is not None:
+        return list(executor.map(_call, tasks))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(_call, tasks))
+
+
+def replicate_until_precise(
+    model: Callable[[int], Dict[str, float]],
+    kpis: List[str],
+    rel_half_width: float = 0.05,
+    confidence: float = 0.95,
+    min_reps: int = 5,
+    max_reps: int = 100,
+    batch_size: int = None,
+    first_seed: int = 0,
+    n_workers: int = None,
+) -> dict:
+    """
+    launch batches of replications until every kpi's student-t half width is
+    within rel_half_width of its mean, or max_reps replications are spent
+    model(seed) returns a dict holding at least the requested kpis
+    the next batch is sized from the current variance estimate, capped at batch_size
+    """
+    batch_size = batch_size or n_workers or os.cpu_count()
+    samples = {kpi: [] for kpi in kpis}
+    seed = first_seed
+    n_next = max(min_reps, batch_size)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        while True:
+            n_next = min(n_next, max_reps - (seed - first_seed))
+            results = run_replications(model, range(seed, seed + n_next), executor=pool)
+            seed += n_next
+            for result in results:
+                for kpi in kpis:
+                    samples[kpi].append(result[kpi])
+
+            n_done = seed - first_seed
+            intervals = {kpi: t_interval(samples[kpi], confidence) for kpi in kpis}
+            converged = all(
+                hw <= rel_half_width * abs(mean) for mean, hw in intervals.values()
+            )
+            if converged or n_done >= max_reps:
+                break
+            if n_done < 2:
+                n_next = batch_size
+                continue
+
+            # replications needed for the least precise kpi : n = (t * s / (r * mean))^2
+            from scipy import stats
+
+            t = stats.t.ppf((1 + confidence) / 2, n_done - 1)
+            n_needed = n_done
+            for kpi, (mean, hw) in intervals.items():
+                std = hw * math.sqrt(n_done) / t
+                target = rel_half_width * abs(mean)
+                if target > 0:
+                    n_needed = max(n_needed, math.ceil((t * std / target) ** 2))
+            n_next = min(batch_size, max(1, n_needed - n_done))
+
+    return {
+        "kpis": {
+            kpi: {"mean": mean, "half_width": hw}
+            for kpi, (mean, hw) in intervals.items()
+        },
+        "replications": n_done,
+        "converged": converged,
+        "confidence": confidence,
+        "samples": samples,
+    }
@@ -0,0 +1,194 @@
+"""
+local results store for replications and sweeps (sqlite)
+runs hold configurations (parameter sets) replicated over seeds; kpis are stored
+in long format with indexes on (config, kpi) so large studies summarize in sql
+parallel workers write whole chunks of replications in one transaction (wal mode)
+"""
+
+import datetime
+import hashlib
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, List
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT,
+    model TEXT,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS configs (
+    config_id INTEGER PRIMARY KEY,
+    config_hash TEXT UNIQUE,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS replications (
+    run_id INTEGER,
+    config_id INTEGER,
+    seed INTEGER,
+    kpi TEXT,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS traces (
+    run_id INTEGER,
+    config_id INTEGER,
+    seed INTEGER,
+    ticket_id TEXT,
+    stage TEXT,
+    start REAL,
+    end REAL
+);
+CREATE INDEX IF NOT EXISTS idx_replications_config_kpi ON replications (config_id, kpi);
+CREATE INDEX IF NOT EXISTS idx_replications_kpi_value ON replications (kpi, value);
+CREATE INDEX IF NOT EXISTS idx_replications_run ON replications (run_id);
+CREATE INDEX IF NOT EXISTS idx_traces_run_config ON traces (run_id, config_id, seed);
+"""
+
+
+def config_hash(params: dict) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class ResultsDB:
+    def __init__(self, path, timeout=60):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path, timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def create_run(self, name: str, model: str = None) -> int:
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (name, model, created_at) VALUES (?, ?, ?)",
+                (name, model, datetime.datetime.now().isoformat()),
+            )
+        return cursor.lastrowid
+
+    def config_id(self, params: dict) -> int:
+        key = config_hash(params)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO configs (config_hash, params) VALUES (?, ?)",
+                (key, json.dumps(params, sort_keys=True)),
+            )
+        return self.conn.execute(
+            "SELECT config_id FROM configs WHERE config_hash = ?", (key,)
+        ).fetchone()[0]
+
+    def insert_replications(
+        self, run_id: int, config_id: int, results: Iterable[tuple]
+    ) -> int:
+        """
+        bulk insert (seed, kpis dict) pairs in a single transaction
+        """
+        rows = [
+            (run_id, config_id, seed, kpi, float(value))
+            for seed, kpis in results
+            for kpi, value in kpis.items()
+        ]
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO replications VALUES (?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def insert_traces(self, run_id: int, config_id: int, rows: Iterable[tuple]) -> None:
+        """
+        bulk insert (seed, ticket_id, stage, start, end) rows
+        """
+        rows = [(run_id, config_id, *row) for row in rows]
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO traces VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def replications(self, kpi: str = None, run_id: int = None) -> pd.DataFrame:
+        query = "SELECT * FROM replications WHERE 1 = 1"
+        args = []
+        if kpi is not None:
+            query += " AND kpi = ?"
+            args.append(kpi)
+        if run_id is not None:
+            query += " AND run_id = ?"
+            args.append(run_id)
+        return pd.read_sql_query(query, self.conn, params=args)
+
+    def summary(self, kpi: str, run_id: int = None) -> pd.DataFrame:
+        """
+        n, mean and std of a kpi per configuration, with the parameters expanded
+        the variance is two-pass (squared deviations from the configuration mean),
+        std is NaN for configurations with a single replication
+        """
+        selected = "SELECT config_id, value FROM replications WHERE kpi = ?"
+        args = [kpi]
+        if run_id is not None:
+            selected += " AND run_id = ?"
+            args.append(run_id)
+        query = f"""
+            WITH selected AS ({selected}),
+            stats AS (
+                SELECT config_id, COUNT(*) AS n, AVG(value) AS mean
+                FROM selected GROUP BY config_id
+            )
+            SELECT s.config_id, c.params, s.n, s.mean,
+                   SUM((x.value - s.mean) * (x.value - s.mean)) AS ss
+            FROM stats s JOIN selected x USING (config_id)
+            JOIN configs c USING (config_id)
+            GROUP BY s.config_id
+        """
+        summary = pd.read_sql_query(query, self.conn, params=args)
+        n = summary["n"]
+        ss = summary.pop("ss").where(n > 1)
+        summary["std"] = (ss / (n - 1).where(n > 1)) ** 0.5
+        params = pd.DataFrame([json.loads(p) for p in summary.pop("params")])
+        return pd.concat([params, summary], axis=1)
+
+
+def _run_chunk(task):
+    path, run_id, config_id, model, seeds = task
+    results = [(seed, model(seed)) for seed in seeds]
+    with ResultsDB(path) as db:
+        return db.insert_replications(run_id, config_id, results)
+
+
+def record_replications(
+    path,
+    run_id: int,
+    model: Callable[[int], Dict[str, float]],
+    configs: List[dict],
+    seeds: Iterable[int],
+    chunk_size: int = 50,
+    n_workers: int = None,
+) -> int:
+    """
+    replicate model(seed, **params) for every configuration over seeds in parallel
+    each worker writes its chunk of replications in one transaction
+    returns the number of kpi rows written
+    """
+    seeds = list(seeds)
+    with ResultsDB(path) as db:
+        config_ids = [db.config_id(params) for params in configs]
+    tasks = [
+        (path, run_id, config_id, partial(model, **params), seeds[i : i + chunk_size])
+        for params, config_id in zip(configs, config_ids)
+        for i in range(0, len(seeds), chunk_size)
+    ]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return sum(pool.map(_run_chunk, tasks))
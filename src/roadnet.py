@@ -0,0 +1,210 @@
+"""
+road network travel times from a local graph file (no network access)
+nodes file : node_id, lat, lon
+edges file : u, v and either minutes or length_miles, optional oneway (0/1)
+depots and sites are snapped to their nearest node and priced with one
+one-to-all dijkstra per depot, on the graph and on its reverse for the way back
+results are cached per (depot, location) pair in a csv next to the scenario,
+with a fingerprint of the graph and both points so edited inputs are re-priced
+"""
+
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from src.traveltime import TravelTimeOracle
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+@dataclass
+class RoadGraph:
+    node_ids: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    graph: csr_matrix
+
+    def __post_init__(self):
+        self.tree = cKDTree(_unit_vectors(self.lat, self.lon))
+
+    @classmethod
+    def from_files(cls, nodes_path, edges_path, minutes_per_mile=1.5):
+        nodes = pd.read_csv(nodes_path)
+        edges = pd.read_csv(edges_path)
+        index = pd.Series(np.arange(len(nodes)), index=nodes["node_id"])
+        u = index[edges["u"]].to_numpy()
+        v = index[edges["v"]].to_numpy()
+        if "minutes" in edges:
+            w = edges["minutes"].to_numpy(dtype=float)
+        else:
+            w = edges["length_miles"].to_numpy(dtype=float) * minutes_per_mile
+        if "oneway" in edges:
+            twoway = edges["oneway"].fillna(0).to_numpy() == 0
+        else:
+            twoway = np.ones(len(edges), dtype=bool)
+        rows = np.concatenate([u, v[twoway]])
+        cols = np.concatenate([v, u[twoway]])
+        weights = np.concatenate([w, w[twoway]])
+        # keep the fastest of parallel edges
+        order = np.lexsort((weights, cols, rows))
+        rows, cols, weights = rows[order], cols[order], weights[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        n = len(nodes)
+        graph = csr_matrix((weights[first], (rows[first], cols[first])), shape=(n, n))
+        return cls(
+            node_ids=nodes["node_id"].to_numpy(),
+            lat=nodes["lat"].to_numpy(dtype=float),
+            lon=nodes["lon"].to_numpy(dtype=float),
+            graph=graph,
+        )
+
+    def fingerprint(self) -> str:
+        """
+        digest of the graph weights and node positions
+        """
+        digest = hashlib.sha1()
+        graph = self.graph.tocsr()
+        for array in (graph.indptr, graph.indices, graph.data, self.lat, self.lon):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def snap(self, coords) -> np.ndarray:
+        """
+        index of the nearest graph node for every (lat, lon)
+        """
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        _, nearest = self.tree.query(_unit_vectors(coords[:, 0], coords[:, 1]))
+        return nearest
+
+    def travel_minutes(self, sources, targets) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (to, back) matrices of shortest minutes between source and target node indices
+        to[i, j] : sources[i] -> targets[j], back[i, j] : targets[j] -> sources[i]
+        """
+        sources = np.asarray(sources)
+        targets = np.asarray(targets)
+        to = dijkstra(self.graph, directed=True, indices=sources)[:, targets]
+        back = dijkstra(self.graph.T.tocsr(), directed=True, indices=sources)
+        return to, back[:, targets]
+
+
+CACHE_COLUMNS = ["depot_id", "location_id", "to_mins", "back_mins", "fingerprint"]
+
+
+def _pair_fingerprint(graph_fingerprint, depot, location) -> str:
+    key = f"{graph_fingerprint}:{float(depot[0])!r},{float(depot[1])!r}:"
+    key += f"{float(location[0])!r},{float(location[1])!r}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _cache_frame(depot_ids, location_ids, to, back, fingerprints):
+    return pd.DataFrame(
+        {
+            "depot_id": np.repeat(depot_ids, len(location_ids)),
+            "location_id": np.tile(location_ids, len(depot_ids)),
+            "to_mins": to.ravel(),
+            "back_mins": back.ravel(),
+            "fingerprint": fingerprints,
+        }
+    )
+
+
+def road_travel_times(
+    road: RoadGraph,
+    depots: Dict[str, Tuple[float, float]],
+    sites: Dict[str, Tuple[float, float]],
+    cache_path=None,
+) -> pd.DataFrame:
+    """
+    shortest road minutes for every depot x (depot + site) pair
+    pairs already in cache_path with the same graph and coordinates are reused,
+    new or stale ones are computed and written back; only the requested pairs
+    are returned
+    """
+    locations = {**depots, **sites}
+    graph_fingerprint = road.fingerprint()
+    requested = pd.DataFrame(
+        [
+            (d, loc, _pair_fingerprint(graph_fingerprint, depots[d], locations[loc]))
+            for d in depots
+            for loc in locations
+        ],
+        columns=["depot_id", "location_id", "fingerprint"],
+    )
+    cached = pd.DataFrame(columns=CACHE_COLUMNS)
+    if cache_path is not None and Path(cache_path).exists():
+        cached = pd.read_csv(cache_path).reindex(columns=CACHE_COLUMNS)
+    known = set(zip(cached["depot_id"], cached["location_id"], cached["fingerprint"]))
+    wanted = list(requested.itertuples(index=False, name=None))
+    hit = np.array([pair in known for pair in wanted], dtype=bool)
+
+    missing_depots = list(dict.fromkeys(requested["depot_id"][~hit]))
+    if missing_depots:
+        location_ids = list(locations)
+        sources = road.snap([depots[d] for d in missing_depots])
+        targets = road.snap([locations[loc] for loc in location_ids])
+        to, back = road.travel_minutes(sources, targets)
+        # requested is ordered depot by depot like the fresh frame
+        fingerprints = requested["fingerprint"][
+            requested["depot_id"].isin(missing_depots)
+        ]
+        fresh = _cache_frame(
+            missing_depots, location_ids, to, back, fingerprints.to_numpy()
+        )
+        # fresh pairs replace stale rows of the same depot and location
+        stale = pd.MultiIndex.from_frame(cached[["depot_id", "location_id"]]).isin(
+            pd.MultiIndex.from_frame(fresh[["depot_id", "location_id"]])
+        )
+        cached = cached[~stale]
+        cached = (
+            fresh if cached.empty else pd.concat([cached, fresh], ignore_index=True)
+        )
+        if cache_path is not None:
+            cached.to_csv(cache_path, index=False)
+
+    result = requested.merge(
+        cached, on=["depot_id", "location_id", "fingerprint"], how="left"
+    )
+    return result[CACHE_COLUMNS]
+
+
+def road_oracle(
+    data, road: RoadGraph, cache_path=None, speed_profile=None, **kwargs
+) -> TravelTimeOracle:
+    """
+    TravelTimeOracle priced on the road graph for a generate_data scenario
+    """
+    base = TravelTimeOracle.from_data(data, speed_profile=speed_profile, **kwargs)
+    times = road_travel_times(road, base.depots, base.sites, cache_path)
+    minutes = times[["to_mins", "back_mins"]].to_numpy(dtype=float)
+    unreachable = ~np.isfinite(minutes).all(axis=1)
+    if unreachable.any():
+        raise ValueError(
+            f"{int(unreachable.sum())} depot/location pairs are not connected "
+            "in the road graph"
+        )
+    times = times.set_index(["depot_id", "location_id"])
+    index = pd.MultiIndex.from_product([list(base.depots), list(base.location_index)])
+    shape = (len(base.depots), len(base.location_index))
+    return TravelTimeOracle(
+        depots=base.depots,
+        sites=base.sites,
+        minutes_per_mile=base.minutes_per_mile,
+        speed_profile=speed_profile,
+        cache_size=base.cache_size,
+        minutes=times["to_mins"].reindex(index).to_numpy(float).reshape(shape),
+        back_minutes=times["back_mins"].reindex(index).to_numpy(float).reshape(shape),
+    )
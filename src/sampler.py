@@ -3,6 +3,7 @@ here goes statistics functions/class for sampling distributions
 """
 
 import numpy as np
+from scipy import stats
 
 
 def sample_from_gauss(mean, std, size):
@@ -23,3 +24,18 @@ def sample_from_exponential(scale, size):
 
 def sample_from_custom_discrete(values, probabilities, size):
     return np.random.choice(values, size, p=probabilities)
+
+
+def sample_from_scipy(dist_name, params, size, random_state=None):
+    return getattr(stats, dist_name).rvs(*params, size=size, random_state=random_state)
+
+
+def sample_stream(dist_name, params, seed=None, batch_size=1024):
+    """
+    endless iterator over a scipy distribution, drawn batch_size values at a time
+    (non negative, for durations)
+    """
+    rng = np.random.default_rng(seed)
+    while True:
+        batch = sample_from_scipy(dist_name, params, batch_size, random_state=rng)
+        yield from np.clip(batch, 0, None).tolist()
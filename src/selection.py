@@ -0,0 +1,116 @@
+"""
+ranking and selection of simulation policies by sequential halving
+every round runs the surviving candidates in parallel on common seeds and keeps
+the better half, so the remaining budget is spent on the close contenders
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict
+
+import numpy as np
+
+from src.analysis import t_interval
+from src.replication import run_tasks
+
+
+def paired_interval(a, b, confidence=0.95):
+    """
+    student-t interval for mean(a - b) over paired (common seed) replications
+    """
+    return t_interval(np.asarray(a) - np.asarray(b), confidence)
+
+
+def sequential_halving(
+    candidates: Dict[str, Callable[[int], float]],
+    budget: int,
+    minimize: bool = True,
+    confidence: float = 0.95,
+    indifference: float = 0.0,
+    min_reps: int = 2,
+    first_seed: int = 0,
+    n_workers: int = None,
+) -> dict:
+    """
+    candidates maps a policy name to a picklable model(seed) -> kpi
+    budget is the total number of replications over all candidates
+    indifference is the smallest kpi difference worth telling apart
+    """
+    names = list(candidates)
+    samples = {name: [] for name in names}
+    survivors = names
+    n_rounds = max(1, math.ceil(math.log2(len(names))))
+    seed = first_seed
+    spent = 0
+    runner_up = None
+    history = []
+
+    def sample_mean(name):
+        return np.mean(samples[name])
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for rnd in range(n_rounds):
+            reps = (budget - spent) // (len(survivors) * (n_rounds - rnd))
+            reps = max(min_reps, reps)
+            seeds = range(seed, seed + reps)
+            seed += reps
+
+            tasks = [(candidates[name], s) for name in survivors for s in seeds]
+            results = run_tasks(tasks, executor=pool)
+            for k, name in enumerate(survivors):
+                samples[name].extend(results[k * reps : (k + 1) * reps])
+            spent += len(tasks)
+
+            ranked = sorted(survivors, key=sample_mean, reverse=not minimize)
+            keep = math.ceil(len(ranked) / 2)
+            history.append(
+                {
+                    "round": rnd,
+                    "replications": reps,
+                    "means": {name: sample_mean(name) for name in ranked},
+                    "eliminated": ranked[keep:],
+                }
+            )
+            if len(ranked) > 1:
+                runner_up = ranked[keep]
+            survivors = ranked[:keep]
+            if len(survivors) == 1:
+                break
+
+    winner = survivors[0]
+    result = {
+        "winner": winner,
+        "runner_up": runner_up,
+        "means": {name: sample_mean(name) for name in names},
+        "replications": {name: len(samples[name]) for name in names},
+        "spent": spent,
+        "history": history,
+    }
+    if runner_up is None:
+        result["statement"] = f"{winner} is the only candidate"
+        return result
+
+    # common seeds: the runner-up saw a prefix of the winner's seeds
+    n = len(samples[runner_up])
+    a, b = samples[runner_up], samples[winner][:n]
+    if not minimize:
+        a, b = b, a
+    gap, half_width = paired_interval(a, b, confidence)
+    result["gap"] = gap
+    result["half_width"] = half_width
+    if gap - half_width > 0:
+        result["statement"] = (
+            f"{winner} beats {runner_up} by {gap:.3f} +/- {half_width:.3f} "
+            f"at {confidence:.0%} confidence"
+        )
+    elif gap + half_width < indifference:
+        result["statement"] = (
+            f"{winner} and {runner_up} are within the indifference zone "
+            f"({gap:.3f} +/- {half_width:.3f} < {indifference}) at {confidence:.0%}"
+        )
+    else:
+        result["statement"] = (
+            f"{winner} leads {runner_up} by {gap:.3f} +/- {half_width:.3f}, "
+            f"not significant at {confidence:.0%}"
+        )
+    return result
@@ -0,0 +1,156 @@
+"""
+region sharded simulation
+depots that never ship tickets of a common order form independent regions
+each region runs in its own process and the traces/kpis are merged afterwards
+"""
+
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+import pandas as pd
+import simpy
+
+from src.analysis import ticket_kpis, trace_to_frame
+from src.simobj import SimEngine
+
+
+class CrossRegionWarning(UserWarning):
+    pass
+
+
+def _find(parent, x):
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+
+def _union(parent, a, b):
+    ra, rb = _find(parent, a), _find(parent, b)
+    if ra != rb:
+        parent[rb] = ra
+
+
+def detect_regions(data: Dict[str, pd.DataFrame]) -> Dict[str, int]:
+    """
+    map depot_id -> region number
+    depots are linked when they ship tickets of the same order (or it is scheduled there)
+    truck home depots and return locations do not link regions; returns that
+    cross regions are reported by check_independence
+    """
+    parent = {depot_id: depot_id for depot_id in data["depots"]["depot_id"]}
+    for order_id, ship_locs in data["tickets"].groupby("order_id")["ship_loc"]:
+        ship_locs = ship_locs.unique()
+        for loc in ship_locs[1:]:
+            _union(parent, ship_locs[0], loc)
+    orders = data["orders"]
+    first_ship = data["tickets"].groupby("order_id")["ship_loc"].first()
+    for order_id, sched_loc in zip(orders["order_id"], orders["sched_loc"]):
+        if order_id in first_ship.index:
+            _union(parent, first_ship[order_id], sched_loc)
+
+    roots = {}
+    regions = {}
+    for depot_id in parent:
+        root = _find(parent, depot_id)
+        regions[depot_id] = roots.setdefault(root, len(roots))
+    return regions
+
+
+def check_independence(data: Dict[str, pd.DataFrame], regions: Dict[str, int]) -> int:
+    """
+    count tickets whose truck returns to a depot of another region and warn about it
+    such trucks leave their shard, so sharded results only approximate a full run
+    """
+    tickets = data["tickets"]
+    crossing = tickets["ship_loc"].map(regions) != tickets["return_loc"].map(regions)
+    n_crossing = int(crossing.sum())
+    if n_crossing:
+        warnings.warn(
+            f"{n_crossing} of {len(tickets)} tickets return to a depot in another "
+            "region; sharded results are approximate",
+            CrossRegionWarning,
+            stacklevel=2,
+        )
+    return n_crossing
+
+
+def split_regions(
+    data: Dict[str, pd.DataFrame], regions: Dict[str, int]
+) -> Dict[int, Dict[str, pd.DataFrame]]:
+    """
+    split a scenario into one scenario per region holding tickets, keyed by the
+    region number of detect_regions
+    depots reached only by cross region returns are kept as parking spots; trucks
+    homed in regions without tickets have nothing to do and are left out (warned)
+    """
+    tickets = data["tickets"]
+    ticket_region = tickets["ship_loc"].map(regions)
+    truck_region = data["trucks"]["home_depot"].map(regions)
+    depot_region = data["depots"]["depot_id"].map(regions)
+
+    idle = ~truck_region.isin(ticket_region.unique())
+    if idle.any():
+        warnings.warn(
+            f"{int(idle.sum())} trucks are homed in regions without tickets and "
+            "are left out of the sharded run",
+            CrossRegionWarning,
+            stacklevel=2,
+        )
+
+    shards = {}
+    for region in sorted(ticket_region.unique()):
+        shard_tickets = tickets[ticket_region == region]
+        depot_ids = set(data["depots"]["depot_id"][depot_region == region])
+        depot_ids |= set(shard_tickets["return_loc"])
+        shards[int(region)] = {
+            "orders": data["orders"][
+                data["orders"]["order_id"].isin(shard_tickets["order_id"])
+            ],
+            "tickets": shard_tickets,
+            "depots": data["depots"][data["depots"]["depot_id"].isin(depot_ids)],
+            "trucks": data["trucks"][truck_region == region],
+        }
+    return shards
+
+
+def run_shard(shard: Dict[str, pd.DataFrame], until=None) -> pd.DataFrame:
+    env = simpy.Environment()
+    se = SimEngine(
+        env=env,
+        orderlist=shard["orders"],
+        ticketlist=shard["tickets"],
+        depotlist=shard["depots"],
+        trucklist=shard["trucks"],
+    )
+    se.run(until=until)
+    trace = trace_to_frame(se.trace)
+    trace.attrs["n_tickets"] = len(shard["tickets"])
+    return trace
+
+
+def run_sharded(data: Dict[str, pd.DataFrame], n_workers=None, until=None) -> dict:
+    """
+    simulate every region in its own process and merge the results
+    returns the merged ticket trace, overall kpis and kpis per region
+    """
+    regions = detect_regions(data)
+    check_independence(data, regions)
+    shards = split_regions(data, regions)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        traces = list(pool.map(run_shard, shards.values(), [until] * len(shards)))
+
+    for region, trace in zip(shards, traces):
+        trace["region"] = region
+    n_tickets = [t.attrs["n_tickets"] for t in traces]
+    trace = pd.concat(traces, ignore_index=True)
+    return {
+        "trace": trace,
+        "kpis": ticket_kpis(trace, n_tickets=sum(n_tickets)),
+        "region_kpis": {
+            region: ticket_kpis(t, n) for region, t, n in zip(shards, traces, n_tickets)
+        },
+        "regions": regions,
+    }
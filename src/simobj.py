@@ -1,9 +1,16 @@
-from dataclasses import dataclass
-from typing import List, Union
+import heapq
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from itertools import groupby
+from operator import attrgetter
+from typing import Callable, Iterable, List, NamedTuple, Union
 
 import pandas as pd
 import simpy
 
+from src.pipeline import Pipeline, Stage
+from src.traveltime import TravelTimeOracle
+
 
 @dataclass
 class Ticket:
@@ -33,11 +40,34 @@ class Ticket:
     sim_site_clean_mins: int = None
     sim_travel_to_mins: int = None
     sim_travel_back_mins: int = None
+    sim_loader_wait_mins: int = None  # truck at the depot waiting for a loader
+
+    def __setattr__(self, name, value):
+        # keep the parent order's progress counters in step with the ticket
+        order = self.__dict__.get("order")
+        if order is not None and name in ORDER_TRACKED_FIELDS:
+            old = self.__dict__.get(name)
+            object.__setattr__(self, name, value)
+            order.on_ticket_update(self, name, old, value)
+        else:
+            object.__setattr__(self, name, value)
 
     @property
     def is_started(self) -> bool:
         return self.sim_ticket_start_time is not None
 
+    @property
+    def is_pending(self) -> bool:
+        """
+        not started loading nor cancelled
+        """
+        return self.sim_ticket_start_time is None and self.sim_status != "cancelled"
+
+
+ORDER_TRACKED_FIELDS = frozenset(
+    ["sim_status", "sim_ticket_start_time", "sim_ticket_arrive_time", "sim_unload_mins"]
+)
+
 
 @dataclass
 class Order:
@@ -54,18 +84,203 @@ class Order:
     site_clean_mins: int
     n_loads: int
     tickets: List[Ticket]
+    # progress counters, updated by the tickets as their state changes
+    n_started: int = 0
+    n_arrived: int = 0
+    n_unloaded: int = 0
+    n_completed: int = 0
+    n_cancelled: int = 0
+    n_late: int = 0
+    total_lateness: float = 0
+    first_start_time: int = None
+    first_arrive_time: int = None
+    last_unload_end_time: int = None
+
+    def __post_init__(self):
+        tickets, self.tickets = self.tickets, []
+        # heap of the pending loads; entries of tickets that left it are dropped
+        # from the top as they surface, and the heap is rebuilt once they make up
+        # half of it, so started and retired tickets are not kept alive
+        self._pending = []
+        self._n_stale = 0
+        for ticket in tickets:
+            self.attach(ticket)
+
+    def attach(self, ticket: Ticket) -> None:
+        """
+        link a ticket to this order so its transitions update the counters
+        """
+        self.tickets.append(ticket)
+        ticket.order = self
+        if ticket.is_pending:
+            heapq.heappush(
+                self._pending, (ticket.load_number, ticket.ticket_id, ticket)
+            )
+
+    def _left_pending(self) -> None:
+        self._n_stale += 1
+        pending = self._pending
+        while pending and not pending[0][2].is_pending:
+            heapq.heappop(pending)
+            self._n_stale -= 1
+        if 2 * self._n_stale > len(pending):
+            self._pending = [entry for entry in pending if entry[2].is_pending]
+            heapq.heapify(self._pending)
+            self._n_stale = 0
+
+    def on_ticket_update(self, ticket: Ticket, name: str, old, new) -> None:
+        if name == "sim_status":
+            if new == old:
+                return
+            if new == "completed":
+                self.n_completed += 1
+            elif new == "cancelled":
+                self.n_cancelled += 1
+                if ticket.sim_ticket_start_time is None:
+                    self._left_pending()
+        elif old is not None or new is None:
+            return
+        elif name == "sim_ticket_start_time":
+            self.n_started += 1
+            self._left_pending()
+            if self.first_start_time is None:
+                self.first_start_time = new
+        elif name == "sim_ticket_arrive_time":
+            self.n_arrived += 1
+            if self.first_arrive_time is None:
+                self.first_arrive_time = new
+            if new > ticket.ticket_arrive_time:
+                self.n_late += 1
+                self.total_lateness += new - ticket.ticket_arrive_time
+        elif name == "sim_unload_mins":
+            self.n_unloaded += 1
+            unload_end_time = ticket.sim_ticket_arrive_time + new
+            if (
+                self.last_unload_end_time is None
+                or unload_end_time > self.last_unload_end_time
+            ):
+                self.last_unload_end_time = unload_end_time
 
     @property
     def is_started(self) -> bool:
-        return any(ticket.sim_ticket_start_time is not None for ticket in self.tickets)
+        return self.n_started > 0
 
     @property
-    def is_finished() -> bool:
-        pass
+    def is_finished(self) -> bool:
+        return self.n_completed + self.n_cancelled >= self.n_loads
 
     @property
-    def progress() -> float:
-        pass
+    def progress(self) -> float:
+        """
+        share of the (not cancelled) loads already unloaded at the site
+        """
+        n_loads = self.n_loads - self.n_cancelled
+        return self.n_unloaded / n_loads if n_loads else 1.0
+
+    @property
+    def outstanding_loads(self) -> int:
+        return self.n_loads - self.n_unloaded - self.n_cancelled
+
+    @property
+    def next_due_load(self) -> Union[Ticket, None]:
+        """
+        lowest numbered load that has not started loading (nor been cancelled)
+        """
+        pending = self._pending
+        return pending[0][2] if pending else None
+
+
+class StageContext(NamedTuple):
+    env: simpy.Environment
+    truck: "Truck"
+    depot: "Depot"
+    oracle: TravelTimeOracle
+
+
+def _enter(status, leaves_location=False):
+    def hook(ticket, ctx):
+        ctx.truck.status = ticket.sim_status = status
+        if leaves_location:
+            ctx.truck.current_location = None
+
+    return hook
+
+
+def _record_elapsed(field):
+    def hook(ticket, ctx, entered, now):
+        setattr(ticket, field, now - entered)
+
+    return hook
+
+
+def _start_loading(ticket, ctx, now):
+    ticket.sim_ticket_start_time = now
+
+
+def _end_loading(ticket, ctx, entered, now):
+    ticket.sim_load_mins = now - ticket.sim_ticket_start_time
+    ticket.sim_loader_wait_mins = ticket.sim_ticket_start_time - entered
+
+
+def _end_site_prep(ticket, ctx, entered, now):
+    ticket.sim_site_prep_mins = now - entered
+    ticket.sim_ticket_arrive_time = now
+
+
+def _travel_to_mins(ticket, ctx):
+    if ctx.oracle is None:
+        return ticket.travel_to_mins
+    return ctx.oracle.travel_mins(ctx.depot.depot_id, ticket.order_id, ctx.env.now)
+
+
+def _travel_back_mins(ticket, ctx):
+    if ctx.oracle is None:
+        return ticket.travel_back_mins
+    return ctx.oracle.travel_mins(ticket.order_id, ticket.return_loc, ctx.env.now)
+
+
+TICKET_PIPELINE = Pipeline(
+    [
+        Stage(
+            "loading",
+            "load_mins",
+            acquire=lambda ticket, ctx: ctx.depot.loading_bay,
+            on_enter=_enter("loading"),
+            on_start=_start_loading,
+            on_end=_end_loading,
+        ),
+        Stage(
+            "travel_to",
+            _travel_to_mins,
+            on_enter=_enter("travel_to", leaves_location=True),
+            on_end=_record_elapsed("sim_travel_to_mins"),
+        ),
+        Stage(
+            "site_prep",
+            "site_prep_mins",
+            on_enter=_enter("site_prep"),
+            on_end=_end_site_prep,
+        ),
+        Stage(
+            "unloading",
+            "unload_mins",
+            on_enter=_enter("unloading"),
+            on_end=_record_elapsed("sim_unload_mins"),
+        ),
+        Stage(
+            "site_clean",
+            "site_clean_mins",
+            on_enter=_enter("site_clean"),
+            on_end=_record_elapsed("sim_site_clean_mins"),
+        ),
+        Stage(
+            "travel_back",
+            _travel_back_mins,
+            on_enter=_enter("travel_back"),
+            on_end=_record_elapsed("sim_travel_back_mins"),
+        ),
+    ]
+)
 
 
 @dataclass
@@ -78,17 +293,56 @@ class Truck:
     status: str = None
     current_location: str = None
     return_location: str = None
+    available: bool = True
 
     def __post_init__(self):
         self.resource = simpy.Resource(self.env, capacity=1)
 
-    def process_ticket(self):
+    def process_ticket(
+        self, ticket: Ticket, depot: "Depot", oracle: TravelTimeOracle = None
+    ):
         """
-        simulates the steps required to complete the ticket
+        simulates the steps required to complete the ticket (TICKET_PIPELINE)
         loading > travel > site_prep > unload > site_clean > travel_back
+        travel legs come from the ticket unless a TravelTimeOracle is given,
+        which prices them at departure time
         # ! release truck resource at the end of the process
         """
-        pass
+        env = self.env
+        with self.resource.request() as truck_req:
+            yield truck_req
+            self.current_location = depot.depot_id
+            self.return_location = ticket.return_loc
+            yield from TICKET_PIPELINE.run(
+                env, ticket, StageContext(env, self, depot, oracle)
+            )
+            self.status = "idle"
+            self.current_location = self.return_location
+
+
+class BatchStore(simpy.Store):
+    """
+    store that also takes a batch of items at once : the batch goes straight into
+    the store (within its capacity) and waiting getters are served in one pass,
+    instead of one put event per item; whatever does not fit, or arrives while
+    puts are already waiting, goes through regular put events
+    relies on BaseResource._trigger_get to serve the getters (simpy 4.x, 4.1.1)
+    """
+
+    def put_many(self, items: List) -> None:
+        items = list(items)
+        room = 0 if self.put_queue else max(0, self.capacity - len(self.items))
+        batch = items[:room] if room != float("inf") else items
+        self.items.extend(batch)
+        # Store._do_get serves one getter per _trigger_get pass : repeat while
+        # items and getters are both waiting
+        while self.items and self.get_queue:
+            waiting = len(self.get_queue)
+            self._trigger_get(None)
+            if len(self.get_queue) == waiting:
+                break
+        for item in items[len(batch) :]:
+            self.put(item)
 
 
 @dataclass
@@ -100,32 +354,208 @@ class Depot:
     loader_capacity: int = 1
 
     def __post_init__(self):
-        self.ticket_queue = simpy.Store(self.env)
+        self.ticket_queue = BatchStore(self.env)
         self.loading_bay = simpy.Resource(self.env, capacity=self.loader_capacity)
+        self.yard = BatchStore(self.env)
 
     def add_ticket(self, ticket: Ticket) -> None:
         self.ticket_queue.put(ticket)
 
+    def add_tickets(self, tickets: List[Ticket]) -> None:
+        """
+        enqueue a batch of tickets without scheduling one put event per ticket
+        waiting getters (truck assignment) are served right away
+        """
+        self.ticket_queue.put_many(tickets)
+
+    def park_truck(self, truck: Truck) -> None:
+        truck.current_location = self.depot_id
+        if not truck.available:
+            truck.status = "unavailable"
+            return
+        truck.status = "idle"
+        self.yard.put(truck)
+
+    def park_trucks(self, trucks: List[Truck]) -> None:
+        """
+        park a batch of available trucks with a single trigger of the yard
+        """
+        for truck in trucks:
+            truck.current_location = self.depot_id
+            truck.status = "idle"
+        self.yard.put_many(trucks)
+
+    def remove_truck(self, truck: Truck) -> bool:
+        """
+        take an idle truck out of the yard, returns False if it is not parked here
+        """
+        if truck in self.yard.items:
+            self.yard.items.remove(truck)
+            return True
+        return False
+
+    def remove_trucks(self, trucks: List[Truck]) -> List[Truck]:
+        """
+        take a batch of trucks out of the yard in one pass, returns those removed
+        """
+        leaving = {id(truck) for truck in trucks}
+        removed = [truck for truck in self.yard.items if id(truck) in leaving]
+        if removed:
+            self.yard.items[:] = [
+                truck for truck in self.yard.items if id(truck) not in leaving
+            ]
+        return removed
+
+    def remove_ticket(self, ticket: Ticket) -> bool:
+        if ticket in self.ticket_queue.items:
+            self.ticket_queue.items.remove(ticket)
+            return True
+        return False
+
     @property
     def queue_size(self) -> int:
         return len(self.ticket_queue.items)
 
 
-# @dataclass
-# class Fleet:
-#     env: simpy.Environment
-#     clockins: pd.DataFrame
-#     trucks: List[Truck]
+class ShiftCalendar:
+    """
+    fleet roster : shifts are (truck_id, start, end) in simulation minutes, any
+    number per truck (breaks are gaps between shifts, overtime a later end)
+    all transitions live in one heap driven by a single process that switches
+    the trucks of a time step on or off together, parking them per depot in one
+    batch; trucks busy at the end of their shift finish the ticket first
+    the roster itself is never consumed : every run (process) walks its own copy
+    of the heap, so one calendar can drive any number of engines
+    """
+
+    def __init__(self, shifts: pd.DataFrame, home_depots: dict):
+        self.home_depots = home_depots
+        by_truck = {}
+        for truck_id, start, end in zip(
+            shifts["truck_id"], shifts["start"], shifts["end"]
+        ):
+            by_truck.setdefault(truck_id, []).append((start, end))
+        # merge the overlapping (or touching) shifts of a truck, so every query
+        # counts trucks and a truck is on shift iff one merged interval covers t
+        self._by_truck = {}
+        for truck_id, truck_shifts in by_truck.items():
+            merged = []
+            for start, end in sorted(truck_shifts):
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._by_truck[truck_id] = (
+                [start for start, _ in merged],
+                [end for _, end in merged],
+            )
 
-#     def __post_init__(self):
-#         self.in_yard = simpy.FilterStore(self.env)
+        transitions = []
+        seq = 0
+        by_depot = {}
+        for truck_id, (starts, ends) in self._by_truck.items():
+            depot_starts, depot_ends = by_depot.setdefault(
+                home_depots[truck_id], ([], [])
+            )
+            depot_starts.extend(starts)
+            depot_ends.extend(ends)
+            for start, end in zip(starts, ends):
+                # +1 on at start, -1 off at end
+                transitions.append((start, seq, truck_id, 1))
+                transitions.append((end, seq + 1, truck_id, -1))
+                seq += 2
+        heapq.heapify(transitions)
+        self._transitions = tuple(transitions)
+        self._starts = {d: sorted(v[0]) for d, v in by_depot.items()}
+        self._ends = {d: sorted(v[1]) for d, v in by_depot.items()}
+        self._all_starts = sorted(t for v in by_depot.values() for t in v[0])
+        self._all_ends = sorted(t for v in by_depot.values() for t in v[1])
+        # trucks on shift in the latest run
+        self.on_shift = set()
+
+    @classmethod
+    def from_trucks(cls, trucklist: pd.DataFrame, days: int = 1, unit: int = 60):
+        """
+        daily roster from clock_in_time / clock_out_time (in hours by default)
+        """
+        rows = [
+            (
+                row.truck_id,
+                day * 24 * unit + row.clock_in_time * unit,
+                day * 24 * unit + row.clock_out_time * unit,
+            )
+            for day in range(days)
+            for row in trucklist.itertuples()
+        ]
+        shifts = pd.DataFrame(rows, columns=["truck_id", "start", "end"])
+        return cls(shifts, dict(zip(trucklist["truck_id"], trucklist["home_depot"])))
 
-#     def request_truck(self, depot: str) -> Truck:
-#         pass
+    def is_on_shift(self, truck_id: str, t: float) -> bool:
+        """
+        O(log k) over the k shifts of the truck
+        """
+        starts, ends = self._by_truck.get(truck_id, ([], []))
+        k = bisect_right(starts, t)
+        return k > 0 and ends[k - 1] > t
 
-#     def truck_clock_in(self):
-#         yield self.env.timeout(self.clock_in_time)
-#         self.current_location = self.home_depot
+    def n_on_shift(self, t: float, depot_id: str = None) -> int:
+        """
+        number of trucks on shift at t, fleet wide or for one home depot (O(log n))
+        """
+        if depot_id is None:
+            starts, ends = self._all_starts, self._all_ends
+        else:
+            starts, ends = self._starts.get(depot_id, []), self._ends.get(depot_id, [])
+        return bisect_right(starts, t) - bisect_right(ends, t)
+
+    @staticmethod
+    def _pop_step(heap, depth):
+        """
+        pop every transition of the next time step, net per truck
+        """
+        now = heap[0][0]
+        changed = set()
+        while heap and heap[0][0] == now:
+            _, _, truck_id, delta = heapq.heappop(heap)
+            depth[truck_id] = depth.get(truck_id, 0) + delta
+            changed.add(truck_id)
+        return now, changed
+
+    def _apply(self, engine: "SimEngine", truck_ids, depth) -> None:
+        parking, leaving = {}, {}
+        for truck_id in truck_ids:
+            truck = engine.get_truck(truck_id)
+            if depth.get(truck_id, 0) > 0:
+                self.on_shift.add(truck_id)
+                if not truck.available:
+                    truck.available = True
+                    if truck.status == "unavailable":
+                        parking.setdefault(truck.current_location, []).append(truck)
+            else:
+                self.on_shift.discard(truck_id)
+                truck.available = False
+                if truck.status == "idle":
+                    leaving.setdefault(truck.current_location, []).append(truck)
+        for depot_id, trucks in leaving.items():
+            for truck in engine.get_depot(depot_id).remove_trucks(trucks):
+                truck.status = "unavailable"
+        for depot_id, trucks in parking.items():
+            engine.get_depot(depot_id).park_trucks(trucks)
+
+    def process(self, engine: "SimEngine"):
+        env = engine.env
+        # a copy of a heap is a heap : the roster stays intact for the next run
+        heap, depth = list(self._transitions), {}
+        self.on_shift = set()
+        # trucks start parked and available : switch off those not on shift yet
+        changed = {truck.truck_id for truck in engine.trucks}
+        while heap and heap[0][0] <= env.now:
+            changed |= self._pop_step(heap, depth)[1]
+        self._apply(engine, changed, depth)
+        while heap:
+            time = heap[0][0]
+            yield env.timeout(time - env.now)
+            self._apply(engine, self._pop_step(heap, depth)[1], depth)
 
 
 # @dataclass
@@ -145,67 +575,105 @@ class Depot:
 
 @dataclass
 class SimEngine:
+    """
+    ticketlist holds the whole horizon in memory
+    ticketstream is an alternative iterable of sorted ticket frames (chunks)
+    tickets are then materialized on release and retired to trace_sink on completion
+    oracle (TravelTimeOracle) prices travel legs at departure time when given
+    shifts (ShiftCalendar) switches trucks on and off shift when given
+    """
+
     env: simpy.Environment
     orderlist: pd.DataFrame
     ticketlist: pd.DataFrame
     depotlist: pd.DataFrame
     trucklist: pd.DataFrame
+    ticketstream: Iterable[pd.DataFrame] = None
+    trace_sink: Callable[[Ticket], None] = None
+    oracle: TravelTimeOracle = None
+    shifts: ShiftCalendar = None
 
     orders: List[Order] = None
     tickets: List[Ticket] = None
     depots: List[Depot] = None
     trucks: List[Truck] = None
+    trace: List[Ticket] = field(default_factory=list)
+    completed_tickets: int = 0
+    late_tickets: int = 0
 
     def __post_init__(self):
-        self.tickets = self._create_ticket_obj(self.ticketlist)
+        if self.ticketstream is None:
+            self.tickets = self._create_ticket_obj(self.ticketlist)
+            self._planned_tickets = sorted(
+                self.tickets, key=attrgetter("ticket_start_time")
+            )
+        else:
+            self.tickets = []
         self.orders = self._create_order_obj(self.orderlist, self.tickets)
         self.depots = self._create_depot_obj(self.depotlist)
         self.trucks = self._create_truck_obj(self.trucklist)
+        self._orders_by_id = {order.order_id: order for order in self.orders}
+        self._tickets_by_id = {ticket.ticket_id: ticket for ticket in self.tickets}
+        self._depots_by_id = {depot.depot_id: depot for depot in self.depots}
+        self._trucks_by_id = {truck.truck_id: truck for truck in self.trucks}
+        for truck in self.trucks:
+            self.get_depot(truck.home_depot).park_truck(truck)
+
+    @staticmethod
+    def _ticket_from_row(row):
+        return Ticket(
+            order_id=row["order_id"],
+            ticket_id=row["ticket_id"],
+            load_number=row["load_number"],
+            ticket_start_time=row["ticket_start_time"],
+            ticket_arrive_time=row["ticket_arrive_time"],
+            load_mins=row["load_mins"],
+            site_prep_mins=row["site_prep_mins"],
+            unload_mins=row["unload_mins"],
+            site_clean_mins=row["site_clean_mins"],
+            ship_loc=row["ship_loc"],
+            distance_to=row["distance_to"],
+            travel_to_mins=row["travel_to_mins"],
+            return_loc=row["return_loc"],
+            distance_back=row["distance_back"],
+            travel_back_mins=row["travel_back_mins"],
+        )
 
     def _create_ticket_obj(self, ticketlist):
         tickets = []
         for _, row in ticketlist.iterrows():
-            ticket = Ticket(
-                order_id=row["order_id"],
-                ticket_id=row["ticket_id"],
-                load_number=row["load_number"],
-                ticket_start_time=row["ticket_start_time"],
-                ticket_arrive_time=row["ticket_arrive_time"],
-                load_mins=row["load_mins"],
-                site_prep_mins=row["site_prep_mins"],
-                unload_mins=row["unload_mins"],
-                site_clean_mins=row["site_clean_mins"],
-                ship_loc=row["ship_loc"],
-                distance_to=row["distance_to"],
-                travel_to_mins=row["travel_to_mins"],
-                return_loc=row["return_loc"],
-                distance_back=row["distance_back"],
-                travel_back_mins=row["travel_back_mins"],
-            )
-            tickets.append(ticket)
+            tickets.append(self._ticket_from_row(row))
         return tickets
 
     def _create_order_obj(self, orderlist, tickets):
+        tickets_by_order = {}
+        for ticket in tickets:
+            tickets_by_order.setdefault(ticket.order_id, []).append(ticket)
         orders = []
         for _, row in orderlist.iterrows():
-            order = Order(
-                order_id=row["order_id"],
-                quantity=row["quantity"],
-                due_time=row["due_time"],
-                due_time_mins=row["due_time_mins"],
-                customer=row["customer"],
-                customer_loc=row["customer_loc"],
-                sched_loc=row["sched_loc"],
-                load_mins=row["load_mins"],
-                site_prep_mins=row["site_prep_mins"],
-                unload_mins=row["unload_mins"],
-                site_clean_mins=row["site_clean_mins"],
-                n_loads=row["n_loads"],
-                tickets=[t for t in tickets if t.order_id == row["order_id"]],
+            orders.append(
+                self._order_from_row(row, tickets_by_order.get(row["order_id"], []))
             )
-            orders.append(order)
         return orders
 
+    @staticmethod
+    def _order_from_row(row, tickets):
+        return Order(
+            order_id=row["order_id"],
+            quantity=row["quantity"],
+            due_time=row["due_time"],
+            due_time_mins=row["due_time_mins"],
+            customer=row["customer"],
+            customer_loc=row["customer_loc"],
+            sched_loc=row["sched_loc"],
+            load_mins=row["load_mins"],
+            site_prep_mins=row["site_prep_mins"],
+            unload_mins=row["unload_mins"],
+            site_clean_mins=row["site_clean_mins"],
+            n_loads=row["n_loads"],
+            tickets=tickets,
+        )
+
     def _create_depot_obj(self, depotlist):
         depots = []
         for _, row in depotlist.iterrows():
@@ -214,6 +682,7 @@ class SimEngine:
                 depot_id=row["depot_id"],
                 depot_lon=row["depot_lon"],
                 depot_lat=row["depot_lat"],
+                loader_capacity=row.get("loader_capacity", 1),
             )
             depots.append(depot)
         return depots
@@ -232,51 +701,170 @@ class SimEngine:
         return trucks
 
     def get_order(self, order_id: str) -> Order:
-        return [order for order in self.orders if order.order_id == order_id][0]
+        return self._orders_by_id[order_id]
 
     def get_ticket(self, ticket_id: str) -> Ticket:
-        return [ticket for ticket in self.tickets if ticket.ticket_id == ticket_id][0]
+        return self._tickets_by_id[ticket_id]
 
     def get_parent_order(self, ticket_id: str) -> Order:
         return self.get_order(self.get_ticket(ticket_id).order_id)
 
     def get_depot(self, depot_id: str) -> Depot:
-        return [depot for depot in self.depots if depot.depot_id == depot_id][0]
+        return self._depots_by_id[depot_id]
 
     def get_truck(self, truck_id: str) -> Truck:
-        return [truck for truck in self.trucks if truck.truck_id == truck_id][0]
+        return self._trucks_by_id[truck_id]
+
+    def _iter_tickets(self):
+        """
+        yield ticket objects sorted by ticket_start_time
+        in-memory tickets are those of ticketlist, sorted when the engine is built
+        (tickets added later with schedule_ticket release themselves); streamed
+        chunks are sorted on arrival
+        and must not go back in time relative to the previous chunk
+        streamed rows only become Ticket objects when the generator reaches them
+        """
+        if self.ticketstream is None:
+            yield from self._planned_tickets
+            return
+        last_time = None
+        for chunk in self.ticketstream:
+            if chunk.empty:
+                continue
+            chunk = chunk.sort_values(by="ticket_start_time", kind="stable")
+            if last_time is not None and chunk["ticket_start_time"].iloc[0] < last_time:
+                raise ValueError("ticket stream is not sorted by ticket_start_time")
+            last_time = chunk["ticket_start_time"].iloc[-1]
+            for _, row in chunk.iterrows():
+                ticket = self._ticket_from_row(row)
+                self.tickets.append(ticket)
+                self._tickets_by_id[ticket.ticket_id] = ticket
+                self.get_order(ticket.order_id).attach(ticket)
+                yield ticket
+
+    def retire_ticket(self, ticket: Ticket) -> None:
+        """
+        hand a completed ticket over to the trace sink
+        streamed tickets are also dropped from the engine to keep memory bounded
+        """
+        ticket.sim_status = "completed"
+        self.completed_tickets += 1
+        if ticket.sim_ticket_arrive_time > ticket.ticket_arrive_time:
+            self.late_tickets += 1
+        if self.trace_sink is None:
+            self.trace.append(ticket)
+        else:
+            self.trace_sink(ticket)
+        if self.ticketstream is not None:
+            self.tickets.remove(ticket)
+            del self._tickets_by_id[ticket.ticket_id]
+            self.get_order(ticket.order_id).tickets.remove(ticket)
 
     def ticket_generator(self):
         """
         spawn tickets in the simulation
         can accommodate different logics :
         vanilla, track site queue, track site progress
+        tickets sharing a ticket_start_time are released together with one event
         """
         env = self.env
-
-        # Sort tickets by start time before processing
-        # sorted_tickets = sorted(self.tickets, key=lambda x: x.ticket_start_time)
-        # ? Assuming tickets are pre-sorted
-        last_time = 0  # Track the last processed ticket time
-
-        for ticket in self.tickets:
-            # Calculate the time to wait until the ticket's start time
-            wait_time = max(0, ticket.ticket_start_time - last_time)
-            # print(f"< {ticket.ticket_id} @ {env.now} continue in : {wait_time}")
-            yield env.timeout(wait_time)
-            last_time = ticket.ticket_start_time
-
-            depot = self.get_depot(ticket.ship_loc)
-            if ticket.sim_status is None:
-                ticket.sim_status = "scheduled"
-                depot.add_ticket(ticket)
-                # print(f"> {ticket.ticket_id} enters queue {depot.depot_id} @ {env.now}")
-                # print(f"$ {depot.depot_id} queue size: {depot.queue_size}")
-                # print()
-
-    def truck_assignment(self):
+        start_time = attrgetter("ticket_start_time")
+
+        for release_time, group in groupby(self._iter_tickets(), key=start_time):
+            if release_time > env.now:
+                yield env.timeout(release_time - env.now)
+
+            by_depot = {}
+            for ticket in group:
+                if ticket.sim_status is None:
+                    ticket.sim_status = "scheduled"
+                    ticket.sim_enter_queue_time = env.now
+                    by_depot.setdefault(ticket.ship_loc, []).append(ticket)
+            for depot_id, tickets in by_depot.items():
+                self.get_depot(depot_id).add_tickets(tickets)
+
+    def truck_assignment(self, depot: Depot):
         """
         assign trucks to tickets
         monitors ticket queues and truck availability, assigning tickets to trucks based on predefined rules or priorities.
         """
-        pass
+        env = self.env
+        while True:
+            ticket = yield depot.ticket_queue.get()
+            truck = yield depot.yard.get()
+            if ticket.sim_status == "cancelled":
+                depot.yard.items.insert(0, truck)
+                continue
+            truck.status = "assigned"
+            env.process(self.ticket_process(truck, ticket, depot))
+
+    def ticket_process(self, truck: Truck, ticket: Ticket, depot: Depot):
+        yield self.env.process(truck.process_ticket(ticket, depot, self.oracle))
+        self.get_depot(ticket.return_loc).park_truck(truck)
+        self.retire_ticket(ticket)
+
+    def add_order(self, order: Order) -> None:
+        self.orders.append(order)
+        self._orders_by_id[order.order_id] = order
+
+    def schedule_ticket(self, ticket: Ticket):
+        """
+        add a ticket while the simulation is running
+        it is released into its depot queue at ticket_start_time (or right away)
+        unknown orders or depots raise KeyError before the engine is touched
+        """
+        order = self.get_order(ticket.order_id)
+        self.get_depot(ticket.ship_loc)
+        self.tickets.append(ticket)
+        self._tickets_by_id[ticket.ticket_id] = ticket
+        order.attach(ticket)
+        return self.env.process(self._release_ticket(ticket))
+
+    def _release_ticket(self, ticket: Ticket):
+        if ticket.ticket_start_time > self.env.now:
+            yield self.env.timeout(ticket.ticket_start_time - self.env.now)
+        if ticket.sim_status is None:
+            ticket.sim_status = "scheduled"
+            ticket.sim_enter_queue_time = self.env.now
+            self.get_depot(ticket.ship_loc).add_ticket(ticket)
+
+    def cancel_ticket(self, ticket_id: str) -> bool:
+        """
+        cancel a ticket that has not been loaded yet, returns False otherwise
+        """
+        ticket = self.get_ticket(ticket_id)
+        if ticket.sim_status == "scheduled":
+            self.get_depot(ticket.ship_loc).remove_ticket(ticket)
+        elif ticket.sim_status is not None:
+            return False
+        ticket.sim_status = "cancelled"
+        return True
+
+    def set_truck_available(self, truck_id: str, depot_id: str = None) -> None:
+        truck = self.get_truck(truck_id)
+        if truck.available:
+            return
+        truck.available = True
+        if truck.status == "unavailable":
+            self.get_depot(depot_id or truck.current_location).park_truck(truck)
+
+    def set_truck_unavailable(self, truck_id: str) -> None:
+        """
+        idle trucks leave their yard at once, busy ones when they are back
+        """
+        truck = self.get_truck(truck_id)
+        truck.available = False
+        if truck.status == "idle":
+            self.get_depot(truck.current_location).remove_truck(truck)
+            truck.status = "unavailable"
+
+    def start(self) -> None:
+        self.env.process(self.ticket_generator())
+        for depot in self.depots:
+            self.env.process(self.truck_assignment(depot))
+        if self.shifts is not None:
+            self.env.process(self.shifts.process(self))
+
+    def run(self, until=None):
+        self.start()
+        self.env.run(until=until)
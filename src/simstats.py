@@ -1,3 +1,203 @@
 """
 Here is logging class, functions, logic
+
+simulation code only puts log records on an in-memory queue; a background writer
+thread formats them and writes them to the handlers in batches (one write and one
+flush per batch), so a run never waits on disk or console i/o
+
+log files rotate by size and can use a compact binary record format
+(read back with read_binary_log); parallel replication workers each write
+their own file (see worker_logging)
 """
+
+import logging
+import logging.handlers
+import os
+import queue
+import struct
+import threading
+from multiprocessing import util
+from pathlib import Path
+from typing import List
+
+# binary record : created (float64), levelno (uint8), message length (uint32)
+RECORD_HEADER = struct.Struct("<dBI")
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    enqueues the record untouched : formatting happens on the writer thread
+    (records stay in process, so log arguments should not be mutated afterwards)
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class BatchFileHandler(logging.Handler):
+    """
+    buffers records and writes them on flush() with a single write call
+    rotates the file once it would exceed max_bytes (0 disables rotation),
+    keeping backup_count older files as path.1, path.2, ...
+    binary=True writes RECORD_HEADER packed records instead of formatted lines
+    """
+
+    def __init__(self, path, max_bytes=0, backup_count=5, binary=False):
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.binary = binary
+        self.buffer = []
+        self.stream = open(self.path, "ab")
+        self.size = self.stream.tell()
+
+    def emit(self, record):
+        try:
+            if self.binary:
+                message = record.getMessage().encode("utf-8")
+                self.buffer.append(
+                    RECORD_HEADER.pack(record.created, record.levelno, len(message))
+                    + message
+                )
+            else:
+                self.buffer.append((self.format(record) + "\n").encode("utf-8"))
+        except Exception:
+            self.handleError(record)
+
+    def rotate(self):
+        self.stream.close()
+        for k in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{k}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{k + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        self.stream = open(self.path, "wb")
+        self.size = 0
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.acquire()
+        try:
+            data = b"".join(self.buffer)
+            self.buffer.clear()
+            if self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+                self.rotate()
+            self.stream.write(data)
+            self.stream.flush()
+            self.size += len(data)
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+        super().close()
+
+
+class QueueLogWriter(threading.Thread):
+    """
+    background thread draining the record queue into the handlers
+    records waiting on the queue are taken together (up to batch_size) and the
+    handlers are flushed once per batch
+    """
+
+    _stop_sentinel = None
+
+    def __init__(self, records: queue.SimpleQueue, handlers, batch_size=1000):
+        super().__init__(name="sim-log-writer", daemon=True)
+        self.records = records
+        self.handlers = list(handlers)
+        self.batch_size = batch_size
+
+    def run(self):
+        records = self.records
+        while True:
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = False
+            for record in batch:
+                if record is self._stop_sentinel:
+                    stopping = True
+                    continue
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            for handler in self.handlers:
+                handler.flush()
+            if stopping:
+                return
+
+    def stop(self):
+        """
+        write out everything queued so far and close the handlers
+        """
+        if not self.is_alive():
+            return
+        self.records.put(self._stop_sentinel)
+        self.join()
+        for handler in self.handlers:
+            handler.close()
+
+
+def start_queued_logging(
+    logger: logging.Logger,
+    handlers: List[logging.Handler],
+    level=logging.INFO,
+    batch_size=1000,
+) -> QueueLogWriter:
+    """
+    replaces the logger handlers by a queue feeding a background writer thread
+    the writer is stopped (and its queue drained) at interpreter or worker exit
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, DeferredQueueHandler):
+            handler.writer.stop()
+    records = queue.SimpleQueue()
+    writer = QueueLogWriter(records, handlers, batch_size)
+    queue_handler = DeferredQueueHandler(records)
+    queue_handler.writer = writer
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    writer.start()
+    # multiprocessing finalizers also run when a pool worker exits
+    util.Finalize(writer, writer.stop, exitpriority=10)
+    return writer
+
+
+def worker_logging(
+    directory="logs",
+    name="worker",
+    level=logging.INFO,
+    binary=False,
+    max_bytes=50 * 2**20,
+    logger_name=None,
+) -> QueueLogWriter:
+    """
+    per process log file <directory>/<name>.<pid>.log (or .bin), meant as a
+    ProcessPoolExecutor initializer so workers never share a file
+    """
+    suffix = "bin" if binary else "log"
+    path = Path(directory) / f"{name}.{os.getpid()}.{suffix}"
+    handler = BatchFileHandler(path, max_bytes=max_bytes, binary=binary)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    handler.setLevel(level)
+    return start_queued_logging(logging.getLogger(logger_name), [handler], level)
+
+
+def read_binary_log(path):
+    """
+    yields (created, levelno, message) from a binary log file
+    """
+    with open(path, "rb") as f:
+        while header := f.read(RECORD_HEADER.size):
+            created, levelno, length = RECORD_HEADER.unpack(header)
+            yield created, levelno, f.read(length).decode("utf-8")
@@ -0,0 +1,75 @@
+"""
+streaming ticket sources and trace sinks for long horizons
+tickets are read in chunks from a sorted historical file (csv or parquet)
+completed tickets are appended to a trace file in batches
+"""
+
+import csv
+from dataclasses import asdict, fields
+from pathlib import Path
+
+import pandas as pd
+
+from src.simobj import Ticket
+
+
+def read_ticket_chunks(path, chunksize=10_000):
+    """
+    yield ticket frames of at most chunksize rows
+    the file is expected to be sorted by ticket_start_time
+    parquet files are read one record batch at a time (requires pyarrow)
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def write_ticket_file(tickets: pd.DataFrame, path) -> None:
+    """
+    persist a ticket frame sorted by release time so it can be streamed back
+    """
+    path = Path(path)
+    tickets = tickets.sort_values(by=["ticket_start_time", "order_id"])
+    if path.suffix == ".parquet":
+        tickets.to_parquet(path, index=False)
+    else:
+        tickets.to_csv(path, index=False)
+
+
+class CsvTraceSink:
+    """
+    collects retired tickets and appends them to a csv file in batches
+    usable as SimEngine(trace_sink=...)
+    """
+
+    def __init__(self, path, buffer_size=1_000):
+        self.path = Path(path)
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.columns = [f.name for f in fields(Ticket)]
+        self.written = 0
+        with open(self.path, "w", newline="") as f:
+            csv.writer(f).writerow(self.columns)
+
+    def __call__(self, ticket: Ticket) -> None:
+        self.buffer.append(asdict(ticket))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns)
+            writer.writerows(self.buffer)
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    def close(self) -> None:
+        self.flush()
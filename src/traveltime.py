@@ -0,0 +1,146 @@
+"""
+precomputed travel times between depots and delivery sites
+the depot x (depot + site) matrix is built once and queried by array indexing,
+travel times are scaled by a time-of-day speed profile
+"""
+
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3959.87433
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """
+    pairwise haversine distances in miles between two sets of points
+    same formula as datagen.haversine, broadcast over arrays
+    """
+    lat1, lon1 = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    lat2, lon2 = np.radians(lat2)[None, :], np.radians(lon2)[None, :]
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+@dataclass
+class TravelTimeOracle:
+    """
+    depots and sites map an id to (lat, lon)
+    speed_profile maps hour of day -> travel time multiplier (missing hours are 1.0)
+    minutes holds the base (multiplier 1.0) travel time from every depot (rows)
+    to every depot and site (columns); it is read only once built
+    back_minutes optionally holds the way back (column -> row depot) for
+    asymmetric road networks, otherwise minutes is used both ways
+    """
+
+    depots: Dict[str, Tuple[float, float]]
+    sites: Dict[str, Tuple[float, float]]
+    minutes_per_mile: float = 1.5
+    speed_profile: Dict[int, float] = None
+    cache_size: int = 4096
+    minutes: np.ndarray = field(default=None, repr=False)
+    back_minutes: np.ndarray = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.depot_index = {depot_id: i for i, depot_id in enumerate(self.depots)}
+        self.location_index = dict(self.depot_index)
+        for site_id in self.sites:
+            self.location_index[site_id] = len(self.location_index)
+
+        if self.minutes is None:
+            depot_coords = np.array(list(self.depots.values()), dtype=float)
+            coords = np.array(
+                list(self.depots.values()) + list(self.sites.values()), dtype=float
+            ).reshape(-1, 2)
+            distance = haversine_matrix(
+                depot_coords[:, 0], depot_coords[:, 1], coords[:, 0], coords[:, 1]
+            )
+            self.minutes = distance * self.minutes_per_mile
+        self.minutes.flags.writeable = False
+        if self.back_minutes is None:
+            self.back_minutes = self.minutes
+        self.back_minutes.flags.writeable = False
+
+        self.hourly = np.ones(24)
+        for hour, multiplier in (self.speed_profile or {}).items():
+            self.hourly[hour] = multiplier
+        self._lookup = lru_cache(maxsize=self.cache_size)(self._uncached)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lookup"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lookup = lru_cache(maxsize=self.cache_size)(self._uncached)
+
+    @classmethod
+    def from_data(cls, data, minutes_per_mile=1.5, speed_profile=None, **kwargs):
+        """
+        build from generate_data output : depots by depot_id, sites by order_id
+        """
+        depots = {
+            row.depot_id: (row.depot_lat, row.depot_lon)
+            for row in data["depots"].itertuples()
+        }
+        sites = dict(zip(data["orders"]["order_id"], data["orders"]["customer_loc"]))
+        return cls(depots, sites, minutes_per_mile, speed_profile, **kwargs)
+
+    def _uncached(self, origin, destination, hour):
+        if origin in self.depot_index:
+            i, j = self.depot_index[origin], self.location_index[destination]
+        elif destination in self.depot_index:
+            i, j = self.depot_index[destination], self.location_index[origin]
+            return round(self.back_minutes[i, j] * self.hourly[hour])
+        else:
+            raise KeyError(f"no depot in {origin} -> {destination}")
+        return round(self.minutes[i, j] * self.hourly[hour])
+
+    def travel_mins(self, origin: str, destination: str, t: float = 0) -> int:
+        """
+        travel minutes from origin to destination departing at simulation minute t
+        one end must be a depot
+        """
+        return self._lookup(origin, destination, int(t // 60) % 24)
+
+    def save(self, path) -> None:
+        """
+        write the matrix and ids to a directory; load() memory-maps the matrix
+        so replication workers share one read-only copy through the page cache
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "minutes.npy", np.asarray(self.minutes))
+        np.save(path / "back_minutes.npy", np.asarray(self.back_minutes))
+        meta = {
+            "depots": self.depots,
+            "sites": self.sites,
+            "minutes_per_mile": self.minutes_per_mile,
+            "speed_profile": self.speed_profile,
+            "cache_size": self.cache_size,
+        }
+        with open(path / "oracle.json", "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path) -> "TravelTimeOracle":
+        path = Path(path)
+        with open(path / "oracle.json") as f:
+            meta = json.load(f)
+        if meta["speed_profile"] is not None:
+            meta["speed_profile"] = {
+                int(h): m for h, m in meta["speed_profile"].items()
+            }
+        meta["depots"] = {k: tuple(v) for k, v in meta["depots"].items()}
+        meta["sites"] = {k: tuple(v) for k, v in meta["sites"].items()}
+        minutes = np.load(path / "minutes.npy", mmap_mode="r")
+        back_minutes = np.load(path / "back_minutes.npy", mmap_mode="r")
+        return cls(minutes=minutes, back_minutes=back_minutes, **meta)